@@ -0,0 +1,99 @@
+## Shared image cache for the PDF tasks: every image xref is extracted and decoded only once, however many pages reference it.
+
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class XrefImageCache:
+    """
+    Size-bounded LRU cache of PDF images keyed by (document name, xref).
+
+    Each entry keeps the dictionary returned by `extract_image` and, once somebody asks for
+    pixels, the decoded OpenCV image for each set of imread flags that was asked for. When
+    the total size of the cached bytes and pixels goes over `max_bytes` the least recently
+    used entries are evicted.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _entry(self, pdf_document, xref: int):
+        key = (pdf_document.name, xref)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+        self.misses += 1
+        base_image = pdf_document.extract_image(xref)
+        entry = {"base_image": base_image, "decoded": {}, "size": len(base_image["image"])}
+        self._entries[key] = entry
+        self._size += entry["size"]
+        self._evict()
+        return entry
+
+    def _evict(self):
+        # Always keep the entry that was just added, even if it is bigger than the budget
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            self._size -= entry["size"]
+            self.evictions += 1
+
+    def get(self, pdf_document, xref: int, decode: bool = False, flags: int = cv2.IMREAD_COLOR):
+        """
+        Returns (base_image, image) for one image reference.
+
+        `base_image` is the dictionary from `extract_image`. `image` is the decoded OpenCV image
+        when `decode` is set, otherwise None. `flags` may ask for a reduced decode
+        (`cv2.IMREAD_REDUCED_*`, see `reduced_decode_flag`). Repeated references with the same
+        flags share the same decoded array, so treat it as read-only.
+        """
+        entry = self._entry(pdf_document, xref)
+        if decode and flags not in entry["decoded"]:
+            image_np = np.frombuffer(entry["base_image"]["image"], np.uint8)
+            image = cv2.imdecode(image_np, flags)
+            entry["decoded"][flags] = image
+            if image is not None:
+                entry["size"] += image.nbytes
+                self._size += image.nbytes
+                self._evict()
+        return entry["base_image"], entry["decoded"][flags] if decode else None
+
+    def extract_image(self, pdf_document, xref: int) -> dict:
+        """Drop-in replacement for `pdf_document.extract_image(xref)`."""
+        return self.get(pdf_document, xref)[0]
+
+    def decode_image(self, pdf_document, xref: int, flags: int = cv2.IMREAD_COLOR) -> np.ndarray:
+        return self.get(pdf_document, xref, decode=True, flags=flags)[1]
+
+    def stats(self) -> dict:
+        # Counts extractions, not distinct images: an evicted image that is referenced again
+        # is extracted again
+        return {"extracted_images": self.misses, "duplicate_references": self.hits,
+                "evictions": self.evictions}
+
+
+def reduced_decode_flag(width: int, min_width: int, grayscale: bool = True):
+    """
+    Returns (imread flag, factor) for the strongest JPEG DCT-domain reduction (1/2, 1/4, 1/8)
+    that still leaves at least `min_width` pixels across; other formats decode fully and are resized.
+    """
+    for factor in (8, 4, 2):
+        if width // factor >= min_width:
+            flag = getattr(cv2, f"IMREAD_REDUCED_{'GRAYSCALE' if grayscale else 'COLOR'}_{factor}")
+            return flag, factor
+    return (cv2.IMREAD_GRAYSCALE if grayscale else cv2.IMREAD_COLOR), 1
+
+
+def format_cache_report(stats: dict) -> str:
+    return (f"Image cache: {stats['extracted_images']} images extracted, "
+            f"{stats['duplicate_references']} duplicate references served from cache, "
+            f"{stats['evictions']} evictions")
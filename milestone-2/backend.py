@@ -1,73 +1,379 @@
+import time
+_import_started = time.perf_counter()
+
 import os
 import io
 import pdfplumber
 from PIL import Image
 import cv2
+import numpy as np
 import re
+import shutil
 import sqlite3
 import csv
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
+from multiprocessing import Pool
+from micr import read_micr_band, parse_micr
+from layouts import LayoutIndex
+from crop_store import CropStore, StoredCrop
 
 # Step 1: Parse PDF to extract images
-def parse_pdf(file_path, output_folder):
+def split_page_ranges(page_count, workers, max_shard_pages=None):
+    """Splits [0, page_count) into contiguous (start, end) shards, a few per worker for load balancing."""
+    shard_size = max(1, -(-page_count // (workers * 4)))
+    if max_shard_pages:
+        shard_size = min(shard_size, max_shard_pages)
+    return [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+
+# Streams whose last filter is an image codec already are complete image files
+PASSTHROUGH_EXTENSIONS = {'DCTDecode': 'jpg', 'JPXDecode': 'jp2'}
+
+def native_image_extension(stream):
+    """Returns the file extension of a still-encoded JPEG/JPEG 2000 stream, or None."""
+    filters = stream.get_filters()
+    if not filters:
+        return None
+    last_filter = filters[-1][0]
+    return PASSTHROUGH_EXTENSIONS.get(getattr(last_filter, 'name', str(last_filter)))
+
+def iter_pdf_pages(pdf):
+    """Yields the pages of an open pdfplumber PDF, dropping each page's parsed objects once the caller moves on."""
+    for page in pdf.pages:
+        yield page
+        page.close()
+
+def save_page_images(page, output_folder, passthrough=False):
+    """
+    Saves the embedded images of one pdfplumber page and returns their paths.
+
+    With passthrough, JPEG and JPEG 2000 streams are written byte-for-byte with their native
+    extension instead of being decoded and re-encoded as PNG.
+    """
+    saved_paths = []
+    for img_index, image in enumerate(page.images):
+        if 'stream' in image:
+            base_image = image['stream']
+            image_bytes = base_image.get_data()
+            image_stem = os.path.join(output_folder, f"page_{page.page_number}_image_{img_index + 1}")
+
+            image_ext = native_image_extension(base_image) if passthrough else None
+            if image_ext:
+                image_path = f"{image_stem}.{image_ext}"
+                with open(image_path, 'wb') as image_file:
+                    image_file.write(image_bytes)
+            else:
+                # Open the image stream with Pillow
+                image_pil = Image.open(io.BytesIO(image_bytes))
+                image_path = f"{image_stem}.png"
+                image_pil.save(image_path)
+            saved_paths.append(image_path)
+    return saved_paths
+
+def _parse_pdf_pages(args):
+    """Pool worker: opens its own pdfplumber handle and saves the images of pages [start, end)."""
+    file_path, output_folder, start, end, passthrough = args
+    saved_paths = []
+    with pdfplumber.open(file_path, pages=range(start + 1, end + 1)) as pdf:
+        for page in iter_pdf_pages(pdf):
+            saved_paths.extend(save_page_images(page, output_folder, passthrough))
+    return saved_paths
+
+def parse_pdf(file_path, output_folder, workers=1, passthrough=False, first_page=1, last_page=None):
+    """
+    Saves the embedded images of pages first_page..last_page (1-based, inclusive; None means the
+    last page) to output_folder and returns the paths in page order.
+
+    With workers > 1 the pages are split into contiguous ranges and extracted by a process
+    pool, each worker opening its own PDF handle. See save_page_images for passthrough.
+    """
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
-    
+
     with pdfplumber.open(file_path) as pdf:
-        for page_number, page in enumerate(pdf.pages):
-            image_regions = page.images
-            if not image_regions:
-                continue
-            
-            for img_index, image in enumerate(image_regions):
-                if 'stream' in image:
-                    base_image = image['stream']
-                    image_bytes = base_image.get_data()
-                    
-                    # Open the image stream with Pillow
-                    image_pil = Image.open(io.BytesIO(image_bytes))
-                    image_path = os.path.join(output_folder, f"page_{page_number + 1}_image_{img_index + 1}.png")
-                    image_pil.save(image_path)
-
-# Step 2: Extract checks from images and resize them
+        page_count = len(pdf.pages)
+    start = first_page - 1
+    end = page_count if last_page is None else min(last_page, page_count)
+    if workers > 1:
+        jobs = [(file_path, output_folder, start + shard_start, start + shard_end, passthrough)
+                for shard_start, shard_end in split_page_ranges(max(0, end - start), workers)]
+        with Pool(workers) as pool:
+            return [path for shard in pool.map(_parse_pdf_pages, jobs) for path in shard]
+
+    return _parse_pdf_pages((file_path, output_folder, start, end, passthrough))
+
+# Pipeline image representation: from decode to crop every stage passes one uint8 numpy array in
+# IMAGE_MODE, 'GRAY' (one channel) or 'BGR'; crops become RGB only at the model boundary (to_model_image)
+IMAGE_MODE = 'GRAY'
+IMAGE_READ_FLAGS = {'GRAY': cv2.IMREAD_GRAYSCALE, 'BGR': cv2.IMREAD_COLOR}
+
+def read_image(image_path):
+    """Decodes an image file straight into IMAGE_MODE; returns None if it cannot be read."""
+    return cv2.imread(image_path, IMAGE_READ_FLAGS[IMAGE_MODE])
+
+def to_pipeline_image(image):
+    """Returns a GRAY or BGR uint8 array in IMAGE_MODE; an array already in that mode is returned as it is."""
+    if IMAGE_MODE == 'GRAY':
+        return image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image if image.ndim == 3 else cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+def to_model_image(crop):
+    """The model boundary: the single conversion of a GRAY or BGR crop into the RGB array TrOCR expects."""
+    return cv2.cvtColor(crop, cv2.COLOR_GRAY2RGB if crop.ndim == 2 else cv2.COLOR_BGR2RGB)
+
+# Step 2: Extract checks from images and normalise them to the fixed template size
+def order_corners(points):
+    """Orders four (x, y) points as top-left, top-right, bottom-right, bottom-left."""
+    points = np.asarray(points, dtype=np.float32).reshape(4, 2)
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([points[np.argmin(sums)], points[np.argmin(diffs)],
+                     points[np.argmax(sums)], points[np.argmax(diffs)]], dtype=np.float32)
+
+def find_check_quad(gray, min_area_ratio=0.25):
+    """Returns the ordered corners of the check outline in a grayscale image, or None if there is no clear one."""
+    edged = cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+    edged = cv2.dilate(edged, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    contour = cv2.convexHull(max(contours, key=cv2.contourArea))
+    if cv2.contourArea(contour) < min_area_ratio * gray.shape[0] * gray.shape[1]:
+        return None
+    approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+    if len(approx) != 4:
+        return None
+    return order_corners(approx)
+
+def estimate_skew(gray, max_angle=15.0):
+    """Estimates the skew of the check in degrees from the long, nearly horizontal printed lines."""
+    edged = cv2.Canny(gray, 50, 150)
+    width = gray.shape[1]
+    lines = cv2.HoughLinesP(edged, 1, np.pi / 360, threshold=100, minLineLength=width // 4, maxLineGap=10)
+    if lines is None:
+        return 0.0
+    x0, y0, x1, y1 = lines.reshape(-1, 4).T.astype(np.float64)
+    angles = np.degrees(np.arctan2(y1 - y0, x1 - x0))
+    angles = angles[np.abs(angles) <= max_angle]
+    # Image y grows downwards, so this is also the rotation that levels the lines again
+    return float(np.median(angles)) if angles.size else 0.0
+
+# Reduced-resolution decoding: JPEGs are decoded at 1/2, 1/4 or 1/8 scale in the DCT domain
+def read_check_image(image_source, fixed_width, fixed_height):
+    """
+    Decodes a check image (a path or a file object) in IMAGE_MODE at the smallest scale that still covers the template.
+
+    PIL's draft() makes the JPEG decoder pick the strongest 1/2, 1/4 or 1/8 DCT-domain reduction
+    that leaves at least fixed_width x fixed_height pixels; other formats decode at full size.
+    normalise_check resamples to exactly the template size, so the check, and the OCR crops cut
+    from it, come from this reduced decode: never below template resolution, and a 300 DPI scan
+    is never decoded in full. Returns None when the image cannot be decoded.
+    """
+    mode = 'L' if IMAGE_MODE == 'GRAY' else 'RGB'
+    try:
+        with Image.open(image_source) as image:
+            image.draft(mode, (fixed_width, fixed_height))
+            if image.mode != mode:
+                image = image.convert(mode)
+            pixels = np.array(image)
+    except Exception:
+        return None
+    if IMAGE_MODE == 'BGR':
+        cv2.cvtColor(pixels, cv2.COLOR_RGB2BGR, dst=pixels)
+    return pixels
+
+def decode_check_image(image_bytes, fixed_width, fixed_height):
+    """read_check_image for the encoded bytes of an image, e.g. a PDF image stream."""
+    return read_check_image(io.BytesIO(image_bytes), fixed_width, fixed_height)
+
+def normalise_check(image, fixed_width, fixed_height, detect_width=1000):
+    """
+    Warps a check image straight into the fixed_width x fixed_height template space.
+
+    If a four-sided check outline is found it is mapped onto the template with one perspective
+    warp. Otherwise the skew is estimated and the rotation and the resize are folded into one
+    affine warp. Either way the pixels are resampled exactly once. The outline and the skew
+    are found on a grayscale copy at most detect_width pixels wide. The result keeps the
+    input's colour mode.
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    detect_scale = min(1.0, detect_width / gray.shape[1])
+    if detect_scale < 1.0:
+        gray = cv2.resize(gray, None, fx=detect_scale, fy=detect_scale, interpolation=cv2.INTER_AREA)
+    template_corners = np.array([[0, 0], [fixed_width - 1, 0], [fixed_width - 1, fixed_height - 1],
+                                 [0, fixed_height - 1]], dtype=np.float32)
+
+    quad = find_check_quad(gray)
+    if quad is not None:
+        matrix = cv2.getPerspectiveTransform((quad / detect_scale).astype(np.float32), template_corners)
+        return cv2.warpPerspective(image, matrix, (fixed_width, fixed_height), flags=cv2.INTER_LINEAR,
+                                   borderMode=cv2.BORDER_REPLICATE)
+
+    height, width = image.shape[:2]
+    rotation = np.vstack([cv2.getRotationMatrix2D((width / 2, height / 2), estimate_skew(gray), 1.0), [0, 0, 1]])
+    scale = np.diag([fixed_width / width, fixed_height / height, 1.0])
+    matrix = (scale @ rotation)[:2]
+    return cv2.warpAffine(image, matrix, (fixed_width, fixed_height), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_REPLICATE)
+
 def extract_checks(input_folder, output_folder, fixed_width, fixed_height):
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
     
     for image_file in os.listdir(input_folder):
         image_path = os.path.join(input_folder, image_file)
-        if image_file.lower().endswith(('png', 'jpg', 'jpeg')):
+        if image_file.lower().endswith(('png', 'jpg', 'jpeg', 'jp2')):
             try:
-                image_pil = Image.open(image_path)
-                resized_image = image_pil.resize((fixed_width, fixed_height), Image.Resampling.LANCZOS)
-                output_image_path = os.path.join(output_folder, image_file)
-                resized_image.save(output_image_path)
+                image = read_check_image(image_path, fixed_width, fixed_height)
+                if image is None:
+                    raise ValueError("could not decode image")
+                normalised_image = normalise_check(image, fixed_width, fixed_height)
+                # Always lossless here: passthrough JPEGs must not be re-compressed before cropping
+                output_image_path = os.path.join(output_folder, os.path.splitext(image_file)[0] + '.png')
+                cv2.imwrite(output_image_path, normalised_image)
             except Exception as e:
                 print(f"Error processing image {image_file}: {e}")
 
 # Step 3: Extract regions of interest from check images
+# Crops go to one packed archive per output folder (see crop_store.py); set PACKED_CROPS to False
+# for the old <cheque>/<field>_region.png folders, or export an archive with `python crop_store.py`
+PACKED_CROPS = True
+CROP_STORE_NAME = 'crops.pack'
+
+def open_crop_store(regions_output_directory):
+    """Opens the crop archive of an output folder for appending, or returns None when PACKED_CROPS is off."""
+    return CropStore(os.path.join(regions_output_directory, CROP_STORE_NAME), 'a') if PACKED_CROPS else None
+
+def save_check_crops(crop_store, regions_output_directory, image_name, crops):
+    """Saves {field: crop} of one check to the crop archive, or to <image_name>/<field>_region.png without one."""
+    if crop_store is not None:
+        crop_store.append_many(image_name, crops)
+        return [f"{crop_store.path}[{image_name}]"]
+    output_page_dir = os.path.join(regions_output_directory, image_name)
+    os.makedirs(output_page_dir, exist_ok=True)
+    saved_paths = []
+    for field, region_of_interest in crops.items():
+        output_image_path = os.path.join(output_page_dir, f"{field}_region.png")
+        cv2.imwrite(output_image_path, region_of_interest)
+        saved_paths.append(output_image_path)
+    return saved_paths
+
 def extract_interest_regions(base_image_directory, regions_of_interest, regions_output_directory):
     if not os.path.exists(regions_output_directory):
         os.makedirs(regions_output_directory)
-    
+    crop_store = open_crop_store(regions_output_directory)
+
     for image_file in os.listdir(base_image_directory):
         image_path = os.path.join(base_image_directory, image_file)
         if image_file.lower().endswith(('png', 'jpg', 'jpeg')):
-            image = cv2.imread(image_path)
+            image = read_image(image_path)
             if image is not None:
                 image_name = os.path.splitext(image_file)[0]
-                output_page_dir = os.path.join(regions_output_directory, image_name)
-                os.makedirs(output_page_dir, exist_ok=True)
-                
-                for field, (x0, y0, x1, y1) in regions_of_interest.items():
-                    region_of_interest = image[y0:y1, x0:x1]
-                    output_image_path = os.path.join(output_page_dir, f"{field}_region.png")
-                    cv2.imwrite(output_image_path, region_of_interest)
-                    print(f"Saved {field} region for {image_file} at {output_image_path}")
+                check_regions = locate_fields(image, regions_of_interest)
+                saved_paths = save_check_crops(crop_store, regions_output_directory, image_name,
+                                               crop_regions(image, check_regions))
+                print(f"Saved {len(check_regions)} regions for {image_file} at {', '.join(saved_paths)}")
+    if crop_store is not None:
+        crop_store.close()
+
+def crop_regions(image, regions_of_interest):
+    """Returns {field: crop} for one check image; the crops are numpy views, not copies."""
+    return {field: image[y0:y1, x0:x1] for field, (x0, y0, x1, y1) in regions_of_interest.items()}
+
+def crop_field_batch(check_images, regions_of_interest, stack=False):
+    """
+    Crops every field of a batch of normalised checks in memory, with no disk I/O.
+
+    Returns {field: crops}. By default the crops are a list of numpy views, one per check, in
+    batch order. With stack=True the batch is stacked once into an (N, H, W, C) array (no copy
+    if check_images already is one) and each field is a single (N, h, w, C) view of it.
+    regions_of_interest may also be a list with one dict per check (see locate_fields); such
+    batches cannot be stacked.
+    """
+    if isinstance(regions_of_interest, list):
+        return {field: [image[y0:y1, x0:x1] for image, (x0, y0, x1, y1) in
+                        zip(check_images, (check_regions[field] for check_regions in regions_of_interest))]
+                for field in regions_of_interest[0]} if regions_of_interest else {}
+    if stack:
+        batch = check_images if isinstance(check_images, np.ndarray) else np.stack(check_images)
+        return {field: batch[:, y0:y1, x0:x1] for field, (x0, y0, x1, y1) in regions_of_interest.items()}
+    return {field: [image[y0:y1, x0:x1] for image in check_images]
+            for field, (x0, y0, x1, y1) in regions_of_interest.items()}
+
+# Layout localiser: the field boxes follow the printed anchors of the check's layout (see layouts.py)
+LAYOUT_INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts')
+# Layouts found by the full anchor search are only saved when this names a writable index
+# directory (e.g. a copy of LAYOUT_INDEX_DIR); the shipped index is never written at run time
+LAYOUT_LEARN_DIR = None
+_layout_index = {}
+
+def layout_index():
+    """Returns the shared LayoutIndex for LAYOUT_INDEX_DIR, or None when localisation is off."""
+    if not LAYOUT_INDEX_DIR:
+        return None
+    index_dir = LAYOUT_LEARN_DIR or LAYOUT_INDEX_DIR
+    if index_dir not in _layout_index:
+        if LAYOUT_LEARN_DIR and not os.path.exists(os.path.join(LAYOUT_LEARN_DIR, 'index.json')):
+            shutil.copytree(LAYOUT_INDEX_DIR, LAYOUT_LEARN_DIR, dirs_exist_ok=True)
+        _layout_index[index_dir] = LayoutIndex(index_dir, learn=bool(LAYOUT_LEARN_DIR))
+    return _layout_index[index_dir]
+
+def locate_fields(check_image, regions_of_interest):
+    """
+    Returns regions_of_interest with each box moved to where the check's layout puts that field.
+
+    The check is first routed to its closest layouts by a thumbnail descriptor (a few ms, see
+    LayoutIndex.classify), so only those layouts' anchors are matched. Boxes the matched
+    layout does not know, and all boxes when no known layout fits the check, are returned
+    unchanged.
+    """
+    index = layout_index()
+    if index is None:
+        return regions_of_interest
+    layout_id, fields = index.locate(check_image)
+    if fields is None:
+        return regions_of_interest
+    return {field: fields.get(field, box) for field, box in regions_of_interest.items()}
 
 # Step 4: Extract text from cropped images using TrOCR
-processor = TrOCRProcessor.from_pretrained('microsoft/trocr-large-stage1')
-model = VisionEncoderDecoderModel.from_pretrained('microsoft/trocr-large-stage1')
+# The model is loaded on the first OCR call, so database and export actions never pay for it
+MODEL_ID = 'microsoft/trocr-large-stage1'
+# 'torch' (fp32 eager), 'int8' (dynamically quantised Linear layers) or 'onnx' (ONNX Runtime)
+OCR_BACKEND = 'torch'
+ONNX_MODEL_DIR = 'trocr-onnx'
+STARTUP_TIMINGS = {}
+_trocr = {}
+
+def load_trocr(backend=None):
+    """
+    Returns the TrOCR (processor, model) for an OCR backend, loading it on first use.
+
+    The 'onnx' backend exports the encoder and the decoder (with a decoder-with-past graph, so
+    greedy decoding reuses the KV cache) to ONNX_MODEL_DIR on first use and runs them with
+    ONNX Runtime; later runs load the exported graphs directly. All backends expose the same
+    generate() interface.
+    """
+    backend = backend or OCR_BACKEND
+    if backend not in _trocr:
+        load_started = time.perf_counter()
+        from transformers import TrOCRProcessor
+        processor = TrOCRProcessor.from_pretrained(MODEL_ID)
+        if backend == 'onnx':
+            from optimum.onnxruntime import ORTModelForVision2Seq
+            if os.path.isdir(ONNX_MODEL_DIR):
+                model = ORTModelForVision2Seq.from_pretrained(ONNX_MODEL_DIR, use_cache=True)
+            else:
+                model = ORTModelForVision2Seq.from_pretrained(MODEL_ID, export=True, use_cache=True)
+                model.save_pretrained(ONNX_MODEL_DIR)
+        elif backend in ('torch', 'int8'):
+            import torch
+            from transformers import VisionEncoderDecoderModel
+            model = VisionEncoderDecoderModel.from_pretrained(MODEL_ID).eval()
+            if backend == 'int8':
+                model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        else:
+            raise ValueError(f"Unknown OCR backend: {backend}")
+        _trocr[backend] = (processor, model)
+        STARTUP_TIMINGS[f'model_load_seconds_{backend}'] = time.perf_counter() - load_started
+    return _trocr[backend]
 
 def validate_text(field, text):
     """Validates the extracted text based on the field type."""
@@ -94,33 +400,611 @@ def validate_text(field, text):
             return text.replace(' ', '')
     return text
 
-def extract_text_from_image(image_path):
-    """Extracts text from a given image using the TrOCR model."""
-    image = Image.open(image_path).convert("RGB")
+def extract_text_from_pil(image, backend=None):
+    """Extracts text from an in-memory RGB PIL image or RGB array using the TrOCR model."""
+    processor, model = load_trocr(backend)
     pixel_values = processor(image, return_tensors="pt").pixel_values  # Batch size 1
     generated_ids = model.generate(pixel_values)
     generated_text = processor.batch_decode(generated_ids, skip_special_tokens=True)[0]
     return generated_text
 
-def process_all_folders(base_dir):
-    """Processes all image folders sequentially and extracts text from each image."""
+def extract_text_from_image(image_path, backend=None):
+    """Extracts text from a given image using the TrOCR model on the given (or default) OCR backend."""
+    image = Image.open(image_path).convert("RGB")
+    return extract_text_from_pil(image, backend)
+
+# Batched OCR: one processor call and one generate call per batch of crops
+OCR_BATCH_SIZE = 16
+
+# Decode-length caps per field, so short numeric fields never wait behind long payee decodes
+FIELD_MAX_NEW_TOKENS = {
+    'date': 16,
+    'account_number': 24,
+    'amount_digits': 16,
+    'name': 32,
+    'payee': 48
+}
+DEFAULT_MAX_NEW_TOKENS = 48
+# Width/height ratios separating the aspect-ratio buckets
+ASPECT_BUCKET_EDGES = (3, 6, 10)
+
+# Field-constrained decoding: numeric fields may only emit digits and separators
+CONSTRAINED_DECODING = True
+FIELD_ALLOWED_CHARACTERS = {
+    'date': '0123456789/-. ',
+    'amount_digits': '0123456789,/-. ',
+    'account_number': '0123456789 '
+}
+# Decoding stops as soon as the whole text matches its field's pattern
+FIELD_COMPLETE_PATTERNS = {
+    'date': r'\d{2}[/.-]?\d{2}[/.-]?\d{4}',
+    'amount_digits': r'[\d,]+/-'
+}
+_field_token_ids = {}
+
+def field_token_ids(field, tokenizer):
+    """Returns the vocabulary ids whose text only uses the field's allowed characters, plus the special tokens."""
+    if field not in _field_token_ids:
+        allowed_characters = set(FIELD_ALLOWED_CHARACTERS[field])
+        token_ids = set(tokenizer.all_special_ids)
+        for token_id in range(len(tokenizer)):
+            token_text = tokenizer.decode([token_id])
+            if token_text and set(token_text) <= allowed_characters:
+                token_ids.add(token_id)
+        _field_token_ids[field] = sorted(token_ids)
+    return _field_token_ids[field]
+
+def field_generate_kwargs(field, tokenizer):
+    """Returns the generate() arguments that restrict the vocabulary of a field and stop once it is complete."""
+    if not CONSTRAINED_DECODING or field not in FIELD_ALLOWED_CHARACTERS:
+        return {}
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    allowed_ids = field_token_ids(field, tokenizer)
+    generate_kwargs = {'prefix_allowed_tokens_fn': lambda batch_id, input_ids: allowed_ids}
+
+    pattern = FIELD_COMPLETE_PATTERNS.get(field)
+    if pattern:
+        class FieldComplete(StoppingCriteria):
+            def __call__(self, input_ids, scores, **kwargs):
+                texts = tokenizer.batch_decode(input_ids, skip_special_tokens=True)
+                done = [re.fullmatch(pattern, re.sub(r'\s+', '', text)) is not None for text in texts]
+                return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+        generate_kwargs['stopping_criteria'] = StoppingCriteriaList([FieldComplete()])
+    return generate_kwargs
+
+def extract_text_batch(images, batch_size=OCR_BATCH_SIZE, max_new_tokens=None, backend=None, field=None):
+    """
+    Extracts text from a list of RGB PIL images or RGB arrays, batch_size images per generate call, in input order.
+
+    When all the images are crops of one field, pass its name to decode with that field's
+    restricted vocabulary and early stop (see field_generate_kwargs).
+    """
+    processor, model = load_trocr(backend)
+    generate_kwargs = field_generate_kwargs(field, processor.tokenizer) if field else {}
+    if max_new_tokens:
+        generate_kwargs['max_new_tokens'] = max_new_tokens
+    texts = []
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        pixel_values = processor(images=batch, return_tensors="pt").pixel_values
+        generated_ids = model.generate(pixel_values, **generate_kwargs)
+        texts.extend(processor.batch_decode(generated_ids, skip_special_tokens=True))
+    return texts
+
+def crop_field(key):
+    """Returns the bare field name of a (cheque, field) key, accepting folder-style names like 'date_region'."""
+    field = key[1]
+    return field[:-len('_region')] if field.endswith('_region') else field
+
+def crop_size(crop):
+    """Returns (width, height) of a crop array, an image path or a StoredCrop; nothing is decoded."""
+    if isinstance(crop, str):
+        with Image.open(crop) as image:
+            return image.size
+    if isinstance(crop, StoredCrop):
+        return crop.size
+    return crop.shape[1], crop.shape[0]
+
+def load_crop(crop):
+    """Returns the pixels of a crop array, an image path or a StoredCrop in IMAGE_MODE."""
+    if isinstance(crop, str):
+        return read_image(crop)
+    if isinstance(crop, StoredCrop):
+        return to_pipeline_image(crop.load())
+    return crop
+
+def schedule_crop_batches(crops, batch_size=OCR_BATCH_SIZE):
+    """
+    Splits a {(cheque, field): crop} mapping into OCR batches and returns [(field, max_new_tokens, keys)].
+
+    Each batch holds a single field type and aspect-ratio bucket, and carries that field's
+    decode cap from FIELD_MAX_NEW_TOKENS. Shorter caps are scheduled first.
+    """
+    groups = {}
+    for key, crop in crops.items():
+        width, height = crop_size(crop)
+        bucket = sum(width / max(height, 1) > edge for edge in ASPECT_BUCKET_EDGES)
+        groups.setdefault((crop_field(key), bucket), []).append(key)
+
+    batches = []
+    for (field, _), keys in groups.items():
+        max_new_tokens = FIELD_MAX_NEW_TOKENS.get(field, DEFAULT_MAX_NEW_TOKENS)
+        for start in range(0, len(keys), batch_size):
+            batches.append((field, max_new_tokens, keys[start:start + batch_size]))
+    batches.sort(key=lambda batch: batch[1])
+    return batches
+
+# Persistent OCR result cache (see ocr_cache.py); set OCR_CACHE_PATH to None to always run the model
+OCR_CACHE_PATH = 'ocr_cache.db'
+_ocr_cache = {}
+
+def ocr_result_cache():
+    """Returns the shared OCRResultCache for OCR_CACHE_PATH, or None when caching is off."""
+    if not OCR_CACHE_PATH:
+        return None
+    if OCR_CACHE_PATH not in _ocr_cache:
+        from ocr_cache import OCRResultCache
+        _ocr_cache[OCR_CACHE_PATH] = OCRResultCache(OCR_CACHE_PATH)
+    return _ocr_cache[OCR_CACHE_PATH]
+
+def report_ocr_cache():
+    cache = ocr_result_cache()
+    if cache is not None:
+        from ocr_cache import format_ocr_cache_report
+        print(format_ocr_cache_report(cache.stats()))
+
+def decoding_config(field, max_new_tokens, backend=None):
+    """Everything besides the pixels that decides what the model reads for a crop; part of the cache key."""
+    constrained = CONSTRAINED_DECODING and field in FIELD_ALLOWED_CHARACTERS
+    return {
+        'model': MODEL_ID,
+        'backend': backend or OCR_BACKEND,
+        'field': field,
+        'max_new_tokens': max_new_tokens,
+        'allowed_characters': FIELD_ALLOWED_CHARACTERS[field] if constrained else None,
+        'complete_pattern': FIELD_COMPLETE_PATTERNS.get(field) if constrained else None
+    }
+
+def ocr_crops(crops, batch_size=OCR_BATCH_SIZE):
+    """
+    OCRs a {(cheque, field): crop} mapping in batches and returns {(cheque, field): text}.
+
+    Crops from many cheques share one generate call, grouped by schedule_crop_batches and
+    decoded with their field's constraints (see field_generate_kwargs). Crops
+    are IMAGE_MODE arrays, image paths or StoredCrops (decoded by load_crop); each crop is
+    converted to RGB once, by to_model_image, one batch at a time, so only batch_size decoded
+    crops are held at once.
+
+    Crops whose pixels and decoding config were OCRed before are answered from the
+    persistent result cache; only the misses reach the model.
+    """
+    cache = ocr_result_cache()
+    texts = {}
+    for field, max_new_tokens, batch_keys in schedule_crop_batches(crops, batch_size):
+        arrays = {key: load_crop(crops[key]) for key in batch_keys}
+        if cache is not None:
+            from ocr_cache import crop_cache_key
+            config = decoding_config(field, max_new_tokens)
+            cache_keys = {key: crop_cache_key(arrays[key], config) for key in batch_keys}
+            cached = cache.get_many(cache_keys.values())
+            for key in batch_keys:
+                if cache_keys[key] in cached:
+                    texts[key] = cached[cache_keys[key]][0]
+            batch_keys = [key for key in batch_keys if key not in texts]
+            if not batch_keys:
+                continue
+        images = [to_model_image(arrays[key]) for key in batch_keys]
+        batch_texts = extract_text_batch(images, batch_size, max_new_tokens, field=field)
+        texts.update(zip(batch_keys, batch_texts))
+        if cache is not None:
+            cache.put_many({cache_keys[key]: (text, validate_text(field, text))
+                            for key, text in zip(batch_keys, batch_texts)})
+    return texts
+
+# Confidence cascade: Tesseract reads every crop first, TrOCR only gets the fields it is unsure about
+OCR_CASCADE = False
+CASCADE_MIN_CONFIDENCE = 70
+CASCADE_STATS = {}
+# Threads that read crops with Tesseract; each keeps its own engine handle for the whole run
+CASCADE_WORKERS = os.cpu_count() or 1
+# The engine is shared with the root tasks; it is loaded from its file, so no PYTHONPATH setup is needed
+TESSERACT_ENGINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tesseract_engine.py')
+_tesseract = {}
+
+def load_tesseract():
+    """
+    Returns the shared (single-line TesseractEngine, thread pool) pair, created on first use.
+
+    The pool lives as long as the engine, so its CASCADE_WORKERS threads, and with them the
+    engine's per-thread API handles, are created once per run instead of once per batch.
+    """
+    if 'engine' not in _tesseract:
+        import importlib.util
+        from concurrent.futures import ThreadPoolExecutor
+        if not os.path.exists(TESSERACT_ENGINE_PATH):
+            raise ImportError(f"OCR_CASCADE needs the Tesseract engine at {TESSERACT_ENGINE_PATH}")
+        spec = importlib.util.spec_from_file_location('tesseract_engine', TESSERACT_ENGINE_PATH)
+        tesseract_engine = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(tesseract_engine)
+        # Page segmentation mode 7: the image is a single text line, which is what a field crop is
+        _tesseract['engine'] = tesseract_engine.TesseractEngine(psm=7)
+        _tesseract['pool'] = ThreadPoolExecutor(CASCADE_WORKERS)
+    return _tesseract['engine'], _tesseract['pool']
+
+def is_valid_field_text(field, text):
+    """Whether validated text looks like a complete value of its field."""
+    if field == 'date':
+        return re.fullmatch(r'\d{2}/\d{2}/\d{4}', text) is not None
+    elif field == 'amount_digits':
+        return re.fullmatch(r'[\d,]+/-', text) is not None
+    elif field == 'account_number':
+        return re.fullmatch(r'\d[\d.]*', text) is not None
+    return len(re.findall(r'[A-Za-z]', text)) >= 2
+
+def cascade_ocr_crops(crops, batch_size=OCR_BATCH_SIZE, min_confidence=CASCADE_MIN_CONFIDENCE):
+    """
+    Same as ocr_crops, but Tesseract reads every crop first and only doubtful crops go to TrOCR.
+
+    A crop is escalated when Tesseract's confidence is below min_confidence or its validated
+    text fails is_valid_field_text. Per-field crop and escalation counts are added to
+    CASCADE_STATS (see report_cascade_stats).
+    """
+    engine, pool = load_tesseract()
+    keys = list(crops)
+
+    def read_crop(key):
+        crop = load_crop(crops[key])
+        # Tesseract reads grayscale: in GRAY mode the crop view goes in as it is
+        return engine.image_to_text_and_confidence(crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY))
+
+    texts = {}
+    escalated = {}
+    for key, (text, confidence) in zip(keys, pool.map(read_crop, keys)):
+        field = crop_field(key)
+        field_stats = CASCADE_STATS.setdefault(field, {'crops': 0, 'escalated': 0})
+        field_stats['crops'] += 1
+        if confidence < min_confidence or not is_valid_field_text(field, validate_text(field, text)):
+            field_stats['escalated'] += 1
+            escalated[key] = crops[key]
+        else:
+            texts[key] = text.strip()
+
+    if escalated:
+        texts.update(ocr_crops(escalated, batch_size))
+    return {key: texts[key] for key in keys}
+
+def report_cascade_stats():
+    for field, field_stats in CASCADE_STATS.items():
+        print(f"Cascade {field}: {field_stats['escalated']}/{field_stats['crops']} escalated to TrOCR "
+              f"({field_stats['escalated'] / field_stats['crops']:.0%})")
+
+def recognise_crops(crops, batch_size=OCR_BATCH_SIZE):
+    """OCRs a {(cheque, field): crop} mapping with the cascade when OCR_CASCADE is set, otherwise with TrOCR alone."""
+    if OCR_CASCADE:
+        return cascade_ocr_crops(crops, batch_size)
+    return ocr_crops(crops, batch_size)
+
+def process_all_folders(base_dir, batch_size=OCR_BATCH_SIZE):
+    """
+    Processes all image folders and extracts text from each image, batch_size crops per OCR call.
+
+    When base_dir holds a packed crop archive (CROP_STORE_NAME), the crops are read from it by
+    (cheque, field) instead of listing per-cheque folders.
+    """
     extracted_data = {}
-    sorted_folders = sorted(os.listdir(base_dir), key=lambda x: int(re.search(r'\d+', x).group()))
+    image_paths = {}
+    crop_store_path = os.path.join(base_dir, CROP_STORE_NAME)
+    crop_store = CropStore(crop_store_path) if os.path.exists(crop_store_path) else None
+    if crop_store is not None:
+        for cheque_id in sorted(crop_store.cheque_ids(), key=lambda x: int(re.search(r'\d+', x).group())):
+            extracted_data[cheque_id] = {}
+            for field in crop_store.fields(cheque_id):
+                image_paths[(cheque_id, f"{field}_region")] = crop_store.crop(cheque_id, field)
+        sorted_folders = []
+    else:
+        sorted_folders = sorted(os.listdir(base_dir), key=lambda x: int(re.search(r'\d+', x).group()))
     for page_folder in sorted_folders:
         page_folder_path = os.path.join(base_dir, page_folder)
         if os.path.isdir(page_folder_path):
-            print(f"Processing folder: {page_folder}")
             extracted_data[page_folder] = {}
             for image_file in os.listdir(page_folder_path):
-                image_path = os.path.join(page_folder_path, image_file)
                 if image_file.lower().endswith(('png', 'jpg', 'jpeg')):
-                    extracted_text = extract_text_from_image(image_path)
                     field_name = os.path.splitext(image_file)[0]
-                    validated_text = validate_text(field_name, extracted_text)
-                    extracted_data[page_folder][field_name] = validated_text
-                    print(f"Text extracted for {field_name}: {validated_text}")
+                    image_paths[(page_folder, field_name)] = os.path.join(page_folder_path, image_file)
+
+    print(f"Processing {len(image_paths)} images from {len(extracted_data)} folders")
+    for (page_folder, field_name), extracted_text in recognise_crops(image_paths, batch_size).items():
+        validated_text = validate_text(field_name, extracted_text)
+        extracted_data[page_folder][field_name] = validated_text
+        print(f"Text extracted for {field_name} of {page_folder}: {validated_text}")
+    if crop_store is not None:
+        crop_store.close()
+    report_ocr_cache()
+    report_cascade_stats()
     return extracted_data
 
+# Blank-field pre-filter: crops with (almost) no ink are marked empty and never reach TrOCR
+BLANK_INK_RATIO = 0.004
+BLANK_MIN_COMPONENTS = 2
+
+def blank_field_mask(crops, min_ink_ratio=BLANK_INK_RATIO, min_components=BLANK_MIN_COMPONENTS, ink_contrast=60):
+    """
+    Returns a boolean array marking which crops of one field are blank.
+
+    crops is an (N, h, w[, C]) array or a list of crops, which may differ in size when each
+    check has its own boxes (see locate_fields). A pixel counts as ink when it is ink_contrast
+    grey levels darker than the median of its crop, which absorbs tinted cheque backgrounds.
+    The median comes from the crop's histogram, so the crop views are never stacked or copied.
+    Crops above min_ink_ratio get a connected-component count, and those with fewer than
+    min_components real strokes (printed guide lines, scanner specks) are blank as well.
+    """
+    blank = np.zeros(len(crops), dtype=bool)
+    for index, crop in enumerate(crops):
+        gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        histogram = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel()
+        background = int(np.searchsorted(np.cumsum(histogram), gray.size / 2))
+        # THRESH_BINARY_INV marks pixels <= thresh, i.e. darker than background - ink_contrast
+        _, ink = cv2.threshold(gray, background - ink_contrast - 1, 255, cv2.THRESH_BINARY_INV)
+        if cv2.countNonZero(ink) < min_ink_ratio * gray.size:
+            blank[index] = True
+            continue
+        _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        strokes = np.count_nonzero(stats[1:, cv2.CC_STAT_AREA] >= 3)
+        blank[index] = strokes < min_components
+    return blank
+
+# MICR code line: the E-13B line at the bottom of the check is read by template matching (see micr.py)
+MICR_REGION = (150, 515, 850, 575)
+# Lowest glyph match score for a MICR line to be trusted; the dataset cheques read at 0.68-0.78
+MICR_MIN_CONFIDENCE = 0.6
+# Opt-in: the MICR fields are not stored in the checks table, so stream_checks skips the read by default
+READ_MICR = False
+
+def read_micr_fields(check_image, micr_region=MICR_REGION, min_confidence=MICR_MIN_CONFIDENCE):
+    """
+    Reads the MICR band of a normalised check; returns ({field: digits}, confidence).
+
+    confidence is the lowest glyph match score of the line. The fields are {} when template
+    matching fails or the confidence is below min_confidence.
+    """
+    x1, y1, x2, y2 = micr_region
+    micr_text, confidence = read_micr_band(check_image[y1:y2, x1:x2])
+    if not micr_text or confidence < min_confidence:
+        return {}, confidence
+    return parse_micr(micr_text), confidence
+
+def ocr_check_batch(image_names, check_images, regions_of_interest, blank_ink_ratio=BLANK_INK_RATIO,
+                    batch_size=OCR_BATCH_SIZE, micr_region=None):
+    """
+    Crops the fields of a batch of normalised checks in memory and OCRs them; returns {image_name: fields}.
+
+    regions_of_interest is one dict for every check, or a list of per-check dicts from locate_fields.
+
+    The non-blank crops of all checks and fields are OCRed together, batch_size per generate
+    call, and mapped back to their (check, field). Crops that blank_field_mask considers empty
+    get '' without running the model; pass blank_ink_ratio=None to OCR every crop.
+
+    With micr_region (e.g. MICR_REGION) the MICR band is read as well: its fields are added,
+    a field it carries replaces OCR of that field, and every check gets a 'micr_confidence'
+    entry (see read_micr_fields).
+    """
+    micr_reads = {image_name: read_micr_fields(check_image, micr_region) if micr_region else ({}, None)
+                  for image_name, check_image in zip(image_names, check_images)}
+    micr_fields = {image_name: fields for image_name, (fields, _) in micr_reads.items()}
+    extracted_data = {image_name: {} for image_name in image_names}
+    pending_crops = {}
+    for field, crops in crop_field_batch(check_images, regions_of_interest).items():
+        blank = blank_field_mask(crops, blank_ink_ratio) if blank_ink_ratio is not None else [False] * len(crops)
+        for image_name, crop, is_blank in zip(image_names, crops, blank):
+            if field in micr_fields[image_name]:
+                extracted_data[image_name][f"{field}_region"] = micr_fields[image_name][field]
+                print(f"MICR {field} for {image_name}, skipping OCR: {micr_fields[image_name][field]}")
+            elif is_blank:
+                extracted_data[image_name][f"{field}_region"] = ''
+                print(f"Blank {field} field for {image_name}, skipping OCR")
+            else:
+                pending_crops[(image_name, field)] = crop
+
+    for (image_name, field), extracted_text in recognise_crops(pending_crops, batch_size).items():
+        validated_text = validate_text(field, extracted_text)
+        extracted_data[image_name][f"{field}_region"] = validated_text
+        print(f"Text extracted for {field} of {image_name}: {validated_text}")
+    # Keep the field order of regions_of_interest for every check, followed by the other MICR fields
+    field_names = list(regions_of_interest[0] if isinstance(regions_of_interest, list) else regions_of_interest)
+    results = {}
+    for image_name, fields in extracted_data.items():
+        results[image_name] = {f"{field}_region": fields[f"{field}_region"] for field in field_names}
+        results[image_name].update((f"{field}_region", digits) for field, digits in micr_fields[image_name].items()
+                                   if field not in field_names)
+        if micr_reads[image_name][1] is not None:
+            results[image_name]['micr_confidence'] = round(micr_reads[image_name][1], 3)
+    return results
+
+# Text-layer router: digitally produced pages already carry their text, so OCR can be skipped
+def extract_fields_from_text_layer(page, regions_of_interest, fixed_width, fixed_height, min_fields=2):
+    """
+    Fills the check fields from the words of a pdfplumber page's text layer.
+
+    The regions of interest are given in the fixed_width x fixed_height check space and are
+    mapped onto the check on the page: the embedded image if there is exactly one, otherwise
+    the whole page. A word belongs to a field when its centre lies inside the field's box.
+    Returns None when fewer than min_fields fields contain any words, i.e. when the page has
+    no usable text layer and has to be OCRed.
+    """
+    words = page.extract_words()
+    if not words:
+        return None
+
+    if len(page.images) == 1:
+        image = page.images[0]
+        left, top, right, bottom = image['x0'], image['top'], image['x1'], image['bottom']
+    else:
+        left, top, right, bottom = page.bbox
+    scale_x = (right - left) / fixed_width
+    scale_y = (bottom - top) / fixed_height
+
+    fields = {}
+    filled_fields = 0
+    for field, (x0, y0, x1, y1) in regions_of_interest.items():
+        box_left, box_right = left + x0 * scale_x, left + x1 * scale_x
+        box_top, box_bottom = top + y0 * scale_y, top + y1 * scale_y
+        field_words = [word['text'] for word in words
+                       if box_left <= (word['x0'] + word['x1']) / 2 <= box_right
+                       and box_top <= (word['top'] + word['bottom']) / 2 <= box_bottom]
+        if field_words:
+            filled_fields += 1
+        fields[f"{field}_region"] = validate_text(field, ' '.join(field_words))
+
+    if filled_fields < min(min_fields, len(regions_of_interest)):
+        return None
+    return fields
+
+# Streaming mode: each page image flows through resize, ROI crop and OCR in memory
+def read_page_images(page, text_layer=None):
+    """
+    Returns [(image_name, image_bytes, native_ext, text_fields)] for one pdfplumber page.
+
+    text_layer is an optional (regions_of_interest, fixed_width, fixed_height) tuple. When it
+    is given and the page has a usable text layer, a single entry with the extracted
+    text_fields and no image bytes is returned instead of the page images.
+    """
+    if text_layer:
+        text_fields = extract_fields_from_text_layer(page, *text_layer)
+        if text_fields is not None:
+            return [(f"page_{page.page_number}_text_layer", None, None, text_fields)]
+
+    return [(f"page_{page.page_number}_image_{img_index + 1}", image['stream'].get_data(),
+             native_image_extension(image['stream']), None)
+            for img_index, image in enumerate(page.images) if 'stream' in image]
+
+# Each pool worker opens the PDF once and keeps the handle for all the page ranges it reads
+_worker_pdf = {}
+
+def _open_worker_pdf(file_path):
+    _worker_pdf['pdf'] = pdfplumber.open(file_path)
+
+def _read_pdf_pages(args):
+    """Pool worker: reads the images of pages [start, end) from the worker's open PDF handle."""
+    start, end, text_layer = args
+    items = []
+    for page in _worker_pdf['pdf'].pages[start:end]:
+        items.extend(read_page_images(page, text_layer))
+        page.close()
+    return items
+
+def iter_pdf_image_streams(file_path, workers=1, text_layer=None):
+    """
+    Yields (image_name, image_bytes, native_ext, text_fields) for every embedded image in the PDF.
+
+    The bytes are left undecoded so the consumer decodes each image exactly once, where it needs
+    the pixels. Only one page is held at a time. With workers > 1 page ranges of at most 16
+    pages are read by a process pool whose workers open the PDF once each and keep the handle,
+    so the page tree is walked once per worker, not once per range. Images still arrive in
+    page order, and only workers * 2 ranges are read ahead of the consumer, so memory stays
+    flat however slow the OCR behind it is.
+    See read_page_images for text_layer.
+    """
+    if workers > 1:
+        with pdfplumber.open(file_path) as pdf:
+            page_count = len(pdf.pages)
+        jobs = [(start, end, text_layer)
+                for start, end in split_page_ranges(page_count, workers, max_shard_pages=16)]
+        with Pool(workers, initializer=_open_worker_pdf, initargs=(file_path,)) as pool:
+            pending = []
+            for job in jobs:
+                pending.append(pool.apply_async(_read_pdf_pages, (job,)))
+                if len(pending) > workers * 2:
+                    yield from pending.pop(0).get()
+            for result in pending:
+                yield from result.get()
+        return
+
+    with pdfplumber.open(file_path) as pdf:
+        for page in iter_pdf_pages(pdf):
+            yield from read_page_images(page, text_layer)
+
+def stream_checks(file_path, regions_of_interest, fixed_width, fixed_height, debug_dir=None, workers=1,
+                  use_text_layer=True, batch_size=8, blank_ink_ratio=BLANK_INK_RATIO,
+                  ocr_batch_size=OCR_BATCH_SIZE):
+    """
+    Yields (image_name, fields) for every check in the PDF without intermediate files.
+
+    Field keys match the folder pipeline ('date_region', ...) so the results can go straight
+    into store_results_in_db. Normalised checks are collected into batches of batch_size,
+    each check's boxes are moved to its layout by locate_fields, and the field crops go to
+    OCR as in-memory views, ocr_batch_size crops per generate call. Blank fields are skipped
+    as described in ocr_check_batch, and the MICR band is only read when READ_MICR is set.
+
+    With use_text_layer, pages that carry a usable text layer are answered from it and never
+    rasterised or OCRed. When debug_dir is given, the page images and resized checks are also
+    written to parsepdf/ and extracted_images/ under it, and the crops to cropped_images/
+    (one packed archive, or per-check folders when PACKED_CROPS is off).
+    """
+    if debug_dir:
+        parsed_dir = os.path.join(debug_dir, "parsepdf")
+        resized_dir = os.path.join(debug_dir, "extracted_images")
+        cropped_dir = os.path.join(debug_dir, "cropped_images")
+        for folder in (parsed_dir, resized_dir, cropped_dir):
+            os.makedirs(folder, exist_ok=True)
+        crop_store = open_crop_store(cropped_dir)
+
+    batch_names, batch_images, batch_regions = [], [], []
+
+    def flush_batch():
+        extracted_data = ocr_check_batch(batch_names, batch_images, batch_regions, blank_ink_ratio,
+                                         ocr_batch_size, MICR_REGION if READ_MICR else None)
+        batch_names.clear()
+        batch_images.clear()
+        batch_regions.clear()
+        return extracted_data.items()
+
+    text_layer = (regions_of_interest, fixed_width, fixed_height) if use_text_layer else None
+    for image_name, image_bytes, image_ext, text_fields in iter_pdf_image_streams(file_path, workers, text_layer):
+        if text_fields is not None:
+            # Keep the output in page order: OCR whatever is queued before this page
+            yield from flush_batch()
+            print(f"Text layer used for {image_name}, skipping OCR: {text_fields}")
+            yield image_name, text_fields
+            continue
+
+        image = decode_check_image(image_bytes, fixed_width, fixed_height)
+        if image is None:
+            print(f"Error processing image {image_name}: could not decode image")
+            continue
+        check_image = normalise_check(image, fixed_width, fixed_height)
+        check_regions = locate_fields(check_image, regions_of_interest)
+
+        if debug_dir:
+            if image_ext:
+                with open(os.path.join(parsed_dir, f"{image_name}.{image_ext}"), 'wb') as image_file:
+                    image_file.write(image_bytes)
+            else:
+                cv2.imwrite(os.path.join(parsed_dir, f"{image_name}.png"), image)
+            cv2.imwrite(os.path.join(resized_dir, f"{image_name}.png"), check_image)
+            save_check_crops(crop_store, cropped_dir, image_name, crop_regions(check_image, check_regions))
+
+        batch_names.append(image_name)
+        batch_images.append(check_image)
+        batch_regions.append(check_regions)
+        if len(batch_images) >= batch_size:
+            yield from flush_batch()
+
+    if batch_images:
+        yield from flush_batch()
+    if debug_dir and crop_store is not None:
+        crop_store.close()
+    report_ocr_cache()
+    report_cascade_stats()
+
+def process_pdf_streaming(file_path, regions_of_interest, fixed_width, fixed_height, debug_dir=None, workers=1,
+                          use_text_layer=True, batch_size=8, blank_ink_ratio=BLANK_INK_RATIO,
+                          ocr_batch_size=OCR_BATCH_SIZE):
+    """Runs stream_checks over the whole PDF and returns {image_name: fields} like process_all_folders."""
+    return dict(stream_checks(file_path, regions_of_interest, fixed_width, fixed_height, debug_dir, workers,
+                              use_text_layer, batch_size, blank_ink_ratio, ocr_batch_size))
+
 # Step 5: Initialize SQLite database
 def initialize_database(database_path):
     conn = sqlite3.connect(database_path)
@@ -238,4 +1122,25 @@ def get_summary_statistics(database_path):
     count, total_amount = cursor.fetchone()
     
     conn.close()
-    return {'total_checks': count, 'total_amount': total_amount}
\ No newline at end of file
+    return {'total_checks': count, 'total_amount': total_amount}
+
+STARTUP_TIMINGS['import_seconds'] = time.perf_counter() - _import_started
+
+def report_startup_timings(load_model=True):
+    """Prints how long importing this module took and, optionally, how long loading TrOCR takes."""
+    print(f"Backend import: {STARTUP_TIMINGS['import_seconds']:.3f} s")
+    if load_model:
+        load_trocr()
+        print(f"TrOCR load ({MODEL_ID}, {OCR_BACKEND}): {STARTUP_TIMINGS[f'model_load_seconds_{OCR_BACKEND}']:.3f} s")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Bank check extraction backend")
+    parser.add_argument('--timings', action='store_true', help="report import time and TrOCR load time")
+    parser.add_argument('--skip-model', action='store_true', help="with --timings, do not load the model")
+    parser.add_argument('--ocr-backend', choices=['torch', 'int8', 'onnx'], default=OCR_BACKEND,
+                        help="OCR backend to load")
+    args = parser.parse_args()
+    OCR_BACKEND = args.ocr_backend
+    if args.timings:
+        report_startup_timings(load_model=not args.skip_model)
\ No newline at end of file
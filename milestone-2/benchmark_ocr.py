@@ -0,0 +1,68 @@
+import os
+import time
+import argparse
+
+import backend
+from backend import (read_check_image, normalise_check, locate_fields, crop_field_batch, to_model_image,
+                     extract_text_batch, load_trocr)
+from layouts import DEFAULT_FIELDS
+
+def edit_distance(a, b):
+    """Levenshtein distance between two strings."""
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+def character_error_rate(predictions, references):
+    """Total edit distance over total reference length."""
+    errors = sum(edit_distance(prediction, reference) for prediction, reference in zip(predictions, references))
+    return errors / max(1, sum(len(reference) for reference in references))
+
+def load_field_crops(dataset_dir, fixed_width=1000, fixed_height=600):
+    """Returns the field crops of every cheque in dataset_dir as RGB arrays, cut like stream_checks cuts them."""
+    check_images, check_regions = [], []
+    for image_file in sorted(os.listdir(dataset_dir)):
+        if image_file.lower().endswith(('png', 'jpg', 'jpeg')):
+            image = read_check_image(os.path.join(dataset_dir, image_file), fixed_width, fixed_height)
+            if image is not None:
+                check_image = normalise_check(image, fixed_width, fixed_height)
+                check_images.append(check_image)
+                check_regions.append(locate_fields(check_image, DEFAULT_FIELDS))
+    crops = []
+    for field_crops in crop_field_batch(check_images, check_regions).values():
+        crops.extend(to_model_image(crop) for crop in field_crops)
+    return crops
+
+def benchmark_backend(ocr_backend, crops, batch_size):
+    """Returns (texts, load seconds, seconds per crop) for one OCR backend."""
+    load_trocr(ocr_backend)
+    load_seconds = backend.STARTUP_TIMINGS[f'model_load_seconds_{ocr_backend}']
+    # Warm-up so one-off graph/kernel setup is not counted
+    extract_text_batch(crops[:1], 1, backend=ocr_backend)
+    started = time.perf_counter()
+    texts = extract_text_batch(crops, batch_size, backend=ocr_backend)
+    return texts, load_seconds, (time.perf_counter() - started) / len(crops)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare OCR backends on the dataset/ cheques")
+    parser.add_argument('--dataset', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset'))
+    parser.add_argument('--backends', nargs='+', default=['int8', 'onnx'], choices=['int8', 'onnx'],
+                        help="backends to compare against the fp32 'torch' baseline")
+    parser.add_argument('--batch-size', type=int, default=1, help="crops per generate call (1 = per-crop latency)")
+    args = parser.parse_args()
+
+    crops = load_field_crops(args.dataset)
+    print(f"Benchmarking {len(crops)} field crops, batch size {args.batch_size}")
+
+    baseline_texts, load_seconds, seconds_per_crop = benchmark_backend('torch', crops, args.batch_size)
+    print(f"{'backend':<8} {'load (s)':>9} {'ms/crop':>9} {'speed-up':>9} {'CER vs fp32':>12}")
+    print(f"{'torch':<8} {load_seconds:>9.1f} {seconds_per_crop * 1000:>9.1f} {1.0:>9.2f} {0.0:>12.4f}")
+    for ocr_backend in args.backends:
+        texts, load_seconds, backend_seconds = benchmark_backend(ocr_backend, crops, args.batch_size)
+        cer = character_error_rate(texts, baseline_texts)
+        print(f"{ocr_backend:<8} {load_seconds:>9.1f} {backend_seconds * 1000:>9.1f} "
+              f"{seconds_per_crop / backend_seconds:>9.2f} {cer:>12.4f}")
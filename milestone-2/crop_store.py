@@ -0,0 +1,230 @@
+## Packed crop store: all field crops of a run live in one append-only archive instead of a directory per cheque.
+
+import os
+import mmap
+import struct
+import argparse
+from collections import namedtuple
+import cv2
+import numpy as np
+
+# Every record is a header, the UTF-8 key 'cheque_id<TAB>field' and the PNG bytes of the crop
+RECORD_MAGIC = b'CROP'
+RECORD_HEADER = struct.Struct('<4sHIII')  # magic, key length, payload length, width, height
+INDEX_SUFFIX = '.idx'
+
+IndexEntry = namedtuple('IndexEntry', 'offset length width height')
+
+
+class StoredCrop(namedtuple('StoredCrop', 'store cheque_id field')):
+    """A lazy reference to one crop of a CropStore; the pixels are only decoded by load()."""
+
+    @property
+    def size(self):
+        """(width, height) of the crop, read from the index."""
+        entry = self.store.index[(self.cheque_id, self.field)]
+        return entry.width, entry.height
+
+    def load(self):
+        return self.store.get(self.cheque_id, self.field)
+
+
+class CropStore:
+    """
+    Append-only archive of PNG-encoded crops with random access by (cheque_id, field).
+
+    Records are appended to one pack file. A sidecar '<path>.idx' holds one
+    'cheque_id, field, offset, length, width, height' line per record, so opening the store never
+    scans the pack. The pack is the source of truth: records missing from the index (after a
+    crash, or with no index at all) are recovered from the record headers, and a torn last
+    record is cut off. Reads go through a memory map of the pack, so a lookup decodes the PNG
+    straight from the mapped pages. Appending an existing key adds a new record that shadows
+    the old one.
+    """
+
+    def __init__(self, path, mode='r'):
+        if mode not in ('r', 'a'):
+            raise ValueError(f"mode must be 'r' or 'a', not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.index = {}
+        self._cheque_fields = {}
+        if mode == 'a':
+            open(path, 'ab').close()
+        self._end = self._load_index()
+        self._pack = open(path, 'r+b' if mode == 'a' else 'rb')
+        self._index_file = open(path + INDEX_SUFFIX, 'a', encoding='utf-8') if mode == 'a' else None
+        self._map = None
+        self._recover()
+
+    def _load_index(self):
+        """Reads the sidecar index and returns the end offset of the last record it covers."""
+        end = 0
+        index_path = self.path + INDEX_SUFFIX
+        if not os.path.exists(index_path):
+            return end
+        valid_length = 0
+        with open(index_path, 'rb') as index_file:
+            for line in index_file:
+                parts = line.decode('utf-8', errors='replace').rstrip('\n').split('\t')
+                if not line.endswith(b'\n') or len(parts) != 6:
+                    break  # Torn last line: the record is recovered from the pack instead
+                cheque_id, field, offset, length, width, height = parts
+                entry = IndexEntry(int(offset), int(length), int(width), int(height))
+                self._remember(cheque_id, field, entry)
+                end = max(end, entry.offset + entry.length)
+                valid_length += len(line)
+        if self.mode == 'a' and valid_length < os.path.getsize(index_path):
+            with open(index_path, 'r+b') as index_file:
+                index_file.truncate(valid_length)
+        return end
+
+    def _recover(self):
+        """Indexes the complete records past the end of the index; in append mode also cuts off a torn last record."""
+        pack_size = os.path.getsize(self.path)
+        if self._end > pack_size:
+            raise ValueError(f"{self.path}{INDEX_SUFFIX} points past the end of the pack; delete it to rebuild")
+        self._pack.seek(self._end)
+        while self._end < pack_size:
+            header = self._pack.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                break
+            magic, key_length, length, width, height = RECORD_HEADER.unpack(header)
+            if magic != RECORD_MAGIC or self._end + RECORD_HEADER.size + key_length + length > pack_size:
+                break
+            cheque_id, field = self._pack.read(key_length).decode('utf-8').split('\t')
+            offset = self._end + RECORD_HEADER.size + key_length
+            self._add_to_index(cheque_id, field, IndexEntry(offset, length, width, height))
+            self._end = offset + length
+            self._pack.seek(self._end)
+        if self._end < pack_size and self.mode == 'a':
+            print(f"Crop store {self.path}: dropping {pack_size - self._end} bytes of a torn record")
+            self._pack.truncate(self._end)
+        self._pack.seek(self._end)
+
+    def _remember(self, cheque_id, field, entry):
+        self.index[(cheque_id, field)] = entry
+        self._cheque_fields.setdefault(cheque_id, {})[field] = None
+
+    def _add_to_index(self, cheque_id, field, entry):
+        self._remember(cheque_id, field, entry)
+        if self._index_file is not None:
+            self._index_file.write(f"{cheque_id}\t{field}\t{entry.offset}\t{entry.length}\t{entry.width}\t{entry.height}\n")
+
+    def append(self, cheque_id, field, crop):
+        """Encodes a crop array as PNG and appends it under (cheque_id, field)."""
+        ok, encoded = cv2.imencode('.png', crop)
+        if not ok:
+            raise ValueError(f"could not encode crop {field} of {cheque_id}")
+        self.append_encoded(cheque_id, field, encoded.tobytes(), crop.shape[1], crop.shape[0])
+
+    def append_encoded(self, cheque_id, field, payload, width, height):
+        """Appends already PNG-encoded crop bytes under (cheque_id, field)."""
+        if self.mode != 'a':
+            raise ValueError("crop store is opened read-only")
+        if '\t' in cheque_id or '\t' in field or '\n' in cheque_id or '\n' in field:
+            raise ValueError("cheque_id and field must not contain tabs or newlines")
+        key = f"{cheque_id}\t{field}".encode('utf-8')
+        self._pack.write(RECORD_HEADER.pack(RECORD_MAGIC, len(key), len(payload), width, height))
+        self._pack.write(key)
+        self._pack.write(payload)
+        offset = self._end + RECORD_HEADER.size + len(key)
+        self._end = offset + len(payload)
+        self._add_to_index(cheque_id, field, IndexEntry(offset, len(payload), width, height))
+
+    def append_many(self, cheque_id, crops):
+        """Appends {field: crop} for one cheque."""
+        for field, crop in crops.items():
+            self.append(cheque_id, field, crop)
+
+    def get_bytes(self, cheque_id, field):
+        """Returns the PNG bytes of a crop as a zero-copy memoryview of the mapped pack."""
+        entry = self.index[(cheque_id, field)]
+        if self._map is None or entry.offset + entry.length > len(self._map):
+            # Map again after appends so the new records are visible; views of the old map stay valid
+            self.flush()
+            self._map = mmap.mmap(self._pack.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)[entry.offset:entry.offset + entry.length]
+
+    def get(self, cheque_id, field, flags=cv2.IMREAD_UNCHANGED):
+        """Decodes one crop; by default in the colour mode it was stored in."""
+        payload = self.get_bytes(cheque_id, field)
+        try:
+            return cv2.imdecode(np.frombuffer(payload, np.uint8), flags)
+        finally:
+            payload.release()
+
+    def crop(self, cheque_id, field):
+        """Returns a StoredCrop reference, for callers that decode crops one batch at a time."""
+        if (cheque_id, field) not in self.index:
+            raise KeyError((cheque_id, field))
+        return StoredCrop(self, cheque_id, field)
+
+    def cheque_ids(self):
+        """Cheque IDs in the order their first crop was stored."""
+        return list(self._cheque_fields)
+
+    def fields(self, cheque_id):
+        return list(self._cheque_fields.get(cheque_id, ()))
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def export_directories(self, output_dir, cheque_ids=None):
+        """
+        Writes crops in the old layout, output_dir/<cheque_id>/<field>_region.png, for debugging.
+
+        The stored PNG bytes are written as they are, without decoding. Exports every cheque
+        unless cheque_ids is given; returns the number of files written.
+        """
+        written = 0
+        for cheque_id in cheque_ids or self.cheque_ids():
+            os.makedirs(os.path.join(output_dir, cheque_id), exist_ok=True)
+            for field in self.fields(cheque_id):
+                payload = self.get_bytes(cheque_id, field)
+                with open(os.path.join(output_dir, cheque_id, f"{field}_region.png"), 'wb') as crop_file:
+                    crop_file.write(payload)
+                payload.release()
+                written += 1
+        return written
+
+    def flush(self):
+        if self.mode == 'a':
+            self._pack.flush()
+            self._index_file.flush()
+
+    def close(self):
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # A caller still holds a get_bytes view; the map is released with it
+            self._map = None
+        self.flush()
+        self._pack.close()
+        if self._index_file is not None:
+            self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect a packed crop store or export it to per-cheque folders")
+    parser.add_argument('archive', help="path of the crop store, e.g. cropped_images/crops.pack")
+    parser.add_argument('--export', metavar='DIR', help="write <DIR>/<cheque_id>/<field>_region.png files")
+    parser.add_argument('--cheque', action='append', help="only export this cheque ID (repeatable)")
+    args = parser.parse_args()
+
+    with CropStore(args.archive) as store:
+        print(f"{args.archive}: {len(store)} crops of {len(store.cheque_ids())} cheques, "
+              f"{os.path.getsize(args.archive)} bytes")
+        if args.export:
+            written = store.export_directories(args.export, args.cheque)
+            print(f"Exported {written} crops to {args.export}")
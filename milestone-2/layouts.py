@@ -0,0 +1,238 @@
+## Anchor-based field localisation: field boxes are placed relative to printed labels ("Pay", "Rupees", ...) found on the check.
+
+import os
+import json
+import argparse
+import cv2
+import numpy as np
+
+# Printed labels and field boxes of the Canara Bank layout in dataset/, in the 1000 x 600 normalised check space
+DEFAULT_ANCHORS = {
+    'pay': (48, 146, 81, 172),
+    'rupees': (48, 203, 140, 224),
+    'account': (64, 331, 121, 356),
+    'date': (778, 94, 971, 114)
+}
+DEFAULT_FIELDS = {
+    'date': (765, 55, 975, 92),
+    'payee': (90, 130, 790, 185),
+    'name': (800, 415, 990, 475),
+    'amount_digits': (735, 225, 970, 290),
+    'account_number': (160, 320, 440, 360)
+}
+
+def to_gray(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+
+# Layout descriptor: perceptual hash of the grey thumbnail plus a hue/saturation histogram
+HASH_SIZE = 8
+HISTOGRAM_BINS = (8, 4)
+
+def layout_descriptor(check_image):
+    """
+    Returns (hash_bits, colour_histogram) for a check, computed on a 64 x 40 thumbnail.
+
+    hash_bits is a HASH_SIZE**2 bool array (DCT perceptual hash, robust to small shifts and
+    lighting); colour_histogram is a hue x saturation histogram normalised to sum to 1.
+    """
+    # Subsample to about 256 px wide first: area-averaging the full check costs more than everything else
+    step = max(1, check_image.shape[1] // 256)
+    thumbnail = cv2.resize(check_image[::step, ::step], (64, 40), interpolation=cv2.INTER_AREA)
+    if thumbnail.ndim == 2:
+        thumbnail = cv2.cvtColor(thumbnail, cv2.COLOR_GRAY2BGR)
+    gray = cv2.resize(to_gray(thumbnail), (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    dct = cv2.dct(gray)[:HASH_SIZE, :HASH_SIZE].flatten()
+    hash_bits = dct > np.median(dct[1:])
+    histogram = cv2.calcHist([cv2.cvtColor(thumbnail, cv2.COLOR_BGR2HSV)], [0, 1], None, list(HISTOGRAM_BINS),
+                             [0, 180, 0, 256]).flatten()
+    return hash_bits, histogram / max(histogram.sum(), 1.0)
+
+def box_distance(box_a, box_b):
+    """Euclidean gap between two (x0, y0, x1, y1) boxes; 0 when they overlap."""
+    dx = max(0, box_a[0] - box_b[2], box_b[0] - box_a[2])
+    dy = max(0, box_a[1] - box_b[3], box_b[1] - box_a[3])
+    return (dx ** 2 + dy ** 2) ** 0.5
+
+def match_anchor(gray, patch, window=None, scales=(1.0,)):
+    """
+    Finds an anchor patch in a grayscale check with normalised cross-correlation.
+
+    Searches window (x0, y0, x1, y1), or the whole image, at each of the given scales and
+    returns (score, box, scale) of the best match; score is -1 when nothing could be searched.
+    """
+    height, width = gray.shape
+    x0, y0, x1, y1 = window or (0, 0, width, height)
+    x0, y0, x1, y1 = max(0, x0), max(0, y0), min(width, x1), min(height, y1)
+    region = gray[y0:y1, x0:x1]
+    best = (-1.0, None, 1.0)
+    for scale in scales:
+        scaled = patch if scale == 1.0 else cv2.resize(patch, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        if region.shape[0] < scaled.shape[0] or region.shape[1] < scaled.shape[1]:
+            continue
+        _, score, _, (x, y) = cv2.minMaxLoc(cv2.matchTemplate(region, scaled, cv2.TM_CCOEFF_NORMED))
+        if score > best[0]:
+            best = (score, (x0 + x, y0 + y, x0 + x + scaled.shape[1], y0 + y + scaled.shape[0]), scale)
+    return best
+
+class LayoutIndex:
+    """
+    On-disk index of check layouts: for each layout, the anchor patches, their boxes and the field boxes.
+
+    index_dir holds index.json and one PNG per anchor (index_dir/<layout>/<anchor>.png). The
+    whole index is loaded into memory once. locate() first routes the check with classify(),
+    which compares its layout_descriptor with every layout's in one vectorised pass, and then
+    looks for the anchors of the route_candidates closest layouts in a small window around
+    where they were learned. Only when none of them fits does it search the whole check at
+    several scales. With learn=True a layout found that way is saved to the index so the next
+    check like it is a lookup again; by default the index is never written at run time.
+    """
+
+    def __init__(self, index_dir, search_margin=40, min_score=0.6, search_scales=(0.8, 0.9, 1.0, 1.1, 1.25),
+                 route_candidates=3, learn=False):
+        self.index_dir = index_dir
+        self.learn = learn
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.search_scales = search_scales
+        self.route_candidates = route_candidates
+        self.layouts = {}
+        self.patches = {}
+        index_path = os.path.join(index_dir, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path, encoding='utf-8') as index_file:
+                self.layouts = json.load(index_file)
+            for layout_id, layout in self.layouts.items():
+                self.patches[layout_id] = {
+                    anchor: cv2.imread(os.path.join(index_dir, layout_id, f"{anchor}.png"), cv2.IMREAD_GRAYSCALE)
+                    for anchor in layout['anchors']}
+        self._index_descriptors()
+
+    def _index_descriptors(self):
+        # Stack every layout's descriptor so classify() compares against all of them at once
+        self._descriptor_ids = [layout_id for layout_id, layout in self.layouts.items() if 'hash' in layout]
+        self._hashes = np.array([[bit == '1' for bit in self.layouts[layout_id]['hash']]
+                                 for layout_id in self._descriptor_ids], bool).reshape(-1, HASH_SIZE ** 2)
+        self._histograms = np.array([self.layouts[layout_id]['histogram'] for layout_id in self._descriptor_ids],
+                                    np.float32).reshape(len(self._descriptor_ids), int(np.prod(HISTOGRAM_BINS)))
+
+    def classify(self, check_image, top=None):
+        """
+        Returns [(layout_id, distance)] for the top closest layouts (all of them by default), closest first.
+
+        The distance is the mean of the hash's Hamming distance and half the histogram's L1
+        distance, both in [0, 1]. A grayscale check has no colour, so it is ranked by the hash
+        alone. Layouts learned without a descriptor come first with distance 0.
+        """
+        ranked = [(layout_id, 0.0) for layout_id, layout in self.layouts.items() if 'hash' not in layout]
+        if self._descriptor_ids:
+            hash_bits, histogram = layout_descriptor(check_image)
+            hash_distances = (self._hashes != hash_bits).mean(axis=1)
+            if check_image.ndim == 2:
+                distances = hash_distances
+            else:
+                histogram_distances = np.abs(self._histograms - histogram).sum(axis=1) / 2
+                distances = (hash_distances + histogram_distances) / 2
+            closest = np.arange(len(distances))
+            if top is not None and top < len(distances):
+                closest = np.argpartition(distances, top)[:top]
+            ranked += [(self._descriptor_ids[i], float(distances[i])) for i in closest[np.argsort(distances[closest])]]
+        return ranked if top is None else ranked[:top]
+
+    def save(self):
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(os.path.join(self.index_dir, 'index.json'), 'w', encoding='utf-8') as index_file:
+            json.dump(self.layouts, index_file, indent=2)
+
+    def register(self, layout_id, check_image, anchors, fields):
+        """Learns a layout from a normalised check: cuts its anchor patches and ties each field to its nearest anchor."""
+        gray = to_gray(check_image)
+        hash_bits, histogram = layout_descriptor(check_image)
+        field_anchors = {field: min(anchors, key=lambda anchor: box_distance(anchors[anchor], box))
+                         for field, box in fields.items()}
+        self.layouts[layout_id] = {
+            'anchors': {anchor: [int(value) for value in box] for anchor, box in anchors.items()},
+            'fields': {field: [int(value) for value in box] for field, box in fields.items()},
+            'field_anchors': field_anchors,
+            'hash': ''.join('1' if bit else '0' for bit in hash_bits),
+            'histogram': [round(float(value), 5) for value in histogram]
+        }
+        self.patches[layout_id] = {anchor: gray[y0:y1, x0:x1].copy() for anchor, (x0, y0, x1, y1) in anchors.items()}
+        os.makedirs(os.path.join(self.index_dir, layout_id), exist_ok=True)
+        for anchor, patch in self.patches[layout_id].items():
+            cv2.imwrite(os.path.join(self.index_dir, layout_id, f"{anchor}.png"), patch)
+        self._index_descriptors()
+        self.save()
+
+    def find_anchors(self, gray, layout_id, full_search=False):
+        """Returns (mean score, {anchor: (box, scale)}) for one layout's anchors on a grayscale check."""
+        found = {}
+        scores = []
+        for anchor, (x0, y0, x1, y1) in self.layouts[layout_id]['anchors'].items():
+            if full_search:
+                score, box, scale = match_anchor(gray, self.patches[layout_id][anchor], scales=self.search_scales)
+            else:
+                margin = self.search_margin
+                score, box, scale = match_anchor(gray, self.patches[layout_id][anchor],
+                                                 (x0 - margin, y0 - margin, x1 + margin, y1 + margin))
+            scores.append(score)
+            found[anchor] = (box, scale)
+        return float(np.mean(scores)) if scores else -1.0, found
+
+    def derive_fields(self, layout_id, found):
+        """Places every field of a layout at the same offset from its anchor as in the layout, scaled like the anchor."""
+        layout = self.layouts[layout_id]
+        fields = {}
+        for field, (x0, y0, x1, y1) in layout['fields'].items():
+            anchor = layout['field_anchors'][field]
+            anchor_x, anchor_y = layout['anchors'][anchor][:2]
+            box, scale = found[anchor]
+            fields[field] = (int(round(box[0] + (x0 - anchor_x) * scale)), int(round(box[1] + (y0 - anchor_y) * scale)),
+                             int(round(box[0] + (x1 - anchor_x) * scale)), int(round(box[1] + (y1 - anchor_y) * scale)))
+        return fields
+
+    def locate(self, check_image):
+        """
+        Returns (layout_id, {field: box}) for a normalised check, or (None, None) when no layout fits.
+
+        Boxes are clipped to the image. With learn set, a layout found by the full search is
+        learned as '<layout>_<n>' with the anchors and boxes of this check.
+        """
+        if not self.layouts:
+            return None, None
+        gray = to_gray(check_image)
+        height, width = gray.shape
+        clip = lambda box: (max(0, box[0]), max(0, box[1]), min(width, box[2]), min(height, box[3]))
+
+        candidates = [layout_id for layout_id, _ in self.classify(check_image, self.route_candidates)]
+        score, found, layout_id = max((self.find_anchors(gray, layout_id) + (layout_id,) for layout_id in candidates),
+                                      key=lambda match: match[0])
+        if score >= self.min_score:
+            return layout_id, {field: clip(box) for field, box in self.derive_fields(layout_id, found).items()}
+
+        for layout_id in candidates:
+            score, found = self.find_anchors(gray, layout_id, full_search=True)
+            if score >= self.min_score:
+                fields = {field: clip(box) for field, box in self.derive_fields(layout_id, found).items()}
+                if not self.learn:
+                    return layout_id, fields
+                learned_id = f"{layout_id}_{len(self.layouts)}"
+                self.register(learned_id, check_image, {anchor: clip(box) for anchor, (box, _) in found.items()}, fields)
+                print(f"Learned layout {learned_id} from {layout_id} (anchor score {score:.2f})")
+                return learned_id, fields
+        return None, None
+
+if __name__ == "__main__":
+    from backend import normalise_check
+    parser = argparse.ArgumentParser(description="Add a check layout to the layout index")
+    parser.add_argument('image', help="check image to learn the layout from")
+    parser.add_argument('--layout', required=True, help="name of the layout, e.g. the bank")
+    parser.add_argument('--index-dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layouts'))
+    parser.add_argument('--anchors', help="JSON {anchor: [x0, y0, x1, y1]} in 1000x600 check space (default: Canara labels)")
+    parser.add_argument('--fields', help="JSON {field: [x0, y0, x1, y1]} in 1000x600 check space (default: Canara fields)")
+    args = parser.parse_args()
+
+    check_image = normalise_check(cv2.imread(args.image), 1000, 600)
+    anchors = json.loads(args.anchors) if args.anchors else DEFAULT_ANCHORS
+    fields = json.loads(args.fields) if args.fields else DEFAULT_FIELDS
+    LayoutIndex(args.index_dir).register(args.layout, check_image, anchors, fields)
+    print(f"Registered layout {args.layout} in {args.index_dir}")
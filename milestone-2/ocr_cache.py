@@ -0,0 +1,108 @@
+## Persistent OCR result cache: crops that were OCRed before are answered from SQLite instead of TrOCR.
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+
+def crop_cache_key(crop, config):
+    """
+    Content address of one OCR result: SHA-256 of the crop's pixels and shape plus the decoding config.
+
+    `config` is any JSON-serialisable description of what produced the text (model ID, backend,
+    field constraints, decode cap), so changing any of them never returns a stale result.
+    Crops are usually views into a larger check image, so the pixels are hashed row by row
+    (each row is contiguous) instead of being copied out with tobytes().
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(config, sort_keys=True).encode())
+    digest.update(str(crop.shape).encode())
+    if crop.flags.c_contiguous:
+        digest.update(crop)
+    else:
+        for row in crop:
+            digest.update(row if row.flags.c_contiguous else row.copy())
+    return digest.hexdigest()
+
+
+class OCRResultCache:
+    """
+    LRU cache of OCR results stored in a SQLite file, keyed by crop_cache_key.
+
+    Each row keeps the raw model output and the validated text. Lookups refresh the row's
+    last-used time; when the table holds more than `max_entries` rows the least recently used
+    ones are deleted.
+    """
+
+    def __init__(self, database_path, max_entries=200000):
+        self.database_path = database_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(database_path, check_same_thread=False)
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS ocr_results (
+                key TEXT PRIMARY KEY,
+                raw_text TEXT,
+                validated_text TEXT,
+                last_used REAL
+            )
+        ''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_results_last_used ON ocr_results (last_used)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+
+    def get_many(self, keys):
+        """Returns {key: (raw_text, validated_text)} for the keys that are cached."""
+        keys = list(keys)
+        found = {}
+        with self._lock:
+            # Stay below SQLite's limit on bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT key, raw_text, validated_text FROM ocr_results WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk).fetchall()
+                found.update((key, (raw_text, validated_text)) for key, raw_text, validated_text in rows)
+            now = time.time()
+            self._conn.executemany("UPDATE ocr_results SET last_used = ? WHERE key = ?",
+                                   [(now, key) for key in found])
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, results):
+        """Stores {key: (raw_text, validated_text)} and evicts the oldest rows if the cache is over budget."""
+        with self._lock:
+            now = time.time()
+            self._entries += sum(1 for key in results
+                                 if not self._conn.execute("SELECT 1 FROM ocr_results WHERE key = ?", (key,)).fetchone())
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ocr_results (key, raw_text, validated_text, last_used) VALUES (?, ?, ?, ?)",
+                [(key, raw_text, validated_text, now) for key, (raw_text, validated_text) in results.items()])
+            if self._entries > self.max_entries:
+                excess = self._entries - self.max_entries
+                self._conn.execute(
+                    "DELETE FROM ocr_results WHERE key IN (SELECT key FROM ocr_results ORDER BY last_used LIMIT ?)",
+                    (excess,))
+                self._entries -= excess
+                self.evictions += excess
+            self._conn.commit()
+
+    def stats(self):
+        return {'entries': self._entries, 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+    def close(self):
+        self._conn.close()
+
+
+def format_ocr_cache_report(stats):
+    lookups = stats['hits'] + stats['misses']
+    hit_rate = stats['hits'] / lookups if lookups else 0.0
+    return (f"OCR cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.0%} hit rate), "
+            f"{stats['evictions']} evictions, {stats['entries']} entries stored")
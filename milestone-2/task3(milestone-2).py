@@ -68,8 +68,16 @@ def extract_interest_regions(base_image_directory, regions_of_interest, regions_
                     print(f"Saved {field} region for {image_file} at {output_image_path}")
 
 # Step 4: Extract text from cropped images using TrOCR
-processor = TrOCRProcessor.from_pretrained('microsoft/trocr-large-stage1')
-model = VisionEncoderDecoderModel.from_pretrained('microsoft/trocr-large-stage1')
+# Loaded once per process: by the pool initializer in workers, or on first use otherwise
+processor = None
+model = None
+
+def load_model():
+    global processor, model
+    if model is None:
+        processor = TrOCRProcessor.from_pretrained('microsoft/trocr-large-stage1')
+        model = VisionEncoderDecoderModel.from_pretrained('microsoft/trocr-large-stage1')
+        model.eval()
 
 def validate_text(field, text):
     """Validates the extracted text based on the field type."""
@@ -98,6 +106,7 @@ def validate_text(field, text):
 
 def extract_text_from_image(image_path):
     """Extracts text from a given image using the TrOCR model."""
+    load_model()
     image = Image.open(image_path).convert("RGB")
     pixel_values = processor(image, return_tensors="pt").pixel_values  # Batch size 1
     generated_ids = model.generate(pixel_values)
@@ -117,16 +126,48 @@ def process_folder(folder_path):
             print(f"Text extracted for {field_name}: {validated_text}")
     return extracted_data
 
-def process_all_folders(base_dir):
-    """Processes all image folders and extracts text from each image."""
+def _init_ocr_worker(torch_threads):
+    """Pool initializer: runs once per worker, before it takes any work."""
+    # Each worker gets its share of the cores instead of every worker spreading over all of them
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+    load_model()
+
+class OCRWorkerPool:
+    """
+    Long-lived pool of OCR worker processes.
+
+    Every worker loads the TrOCR model exactly once, when it starts, and then takes folders
+    from the pool's task queue until the pool is closed, so one pool can serve any number of
+    process_all_folders calls. Each worker gets cpu_count() // workers torch threads.
+    """
+    def __init__(self, workers=2):
+        self.workers = max(1, min(workers, cpu_count()))
+        self.torch_threads = max(1, cpu_count() // self.workers)
+        self.pool = Pool(self.workers, initializer=_init_ocr_worker, initargs=(self.torch_threads,))
+
+    def map(self, folder_paths):
+        # chunksize=1: whichever worker is free takes the next folder
+        return self.pool.imap(process_folder, folder_paths, chunksize=1)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def process_all_folders(base_dir, ocr_pool):
+    """Processes all image folders on the given OCRWorkerPool and extracts text from each image."""
     extracted_data = {}
     sorted_folders = sorted(os.listdir(base_dir), key=lambda x: int(re.search(r'\d+', x).group()))
-    folder_paths = [os.path.join(base_dir, folder) for folder in sorted_folders if os.path.isdir(os.path.join(base_dir, folder))]
+    sorted_folders = [folder for folder in sorted_folders if os.path.isdir(os.path.join(base_dir, folder))]
+    folder_paths = [os.path.join(base_dir, folder) for folder in sorted_folders]
     
-    with Pool(cpu_count()) as pool:
-        results = pool.map(process_folder, folder_paths)
-    
-    for folder, data in zip(sorted_folders, results):
+    for folder, data in zip(sorted_folders, ocr_pool.map(folder_paths)):
         extracted_data[folder] = data
     
     return extracted_data
@@ -173,39 +214,43 @@ def store_results_in_db(results, database_path):
     conn.commit()
     conn.close()
 
-# Define paths and parameters
-pdf_file_path = r"Cheque.pdf"
-extracted_images_folder = r"parsepdf"
-resized_checks_folder = r"extracted_images"
-cropped_images_folder = r"cropped_images"
-database_path = r"checks.db"
-fixed_width = 1000
-fixed_height = 600
-regions_of_interest = {
-    'date': (754, 40, 970, 88),
-    'payee': (70, 120, 760, 175),
-    'name': (825, 440, 990, 475),
-    'amount_digits': (735, 225, 970, 290),
-    'account_number': (115, 300, 320, 335)
-}
-
-# Run the workflow
-initialize_database(database_path)
-parse_pdf(pdf_file_path, extracted_images_folder)
-extract_checks(extracted_images_folder, resized_checks_folder, fixed_width, fixed_height)
-extract_interest_regions(resized_checks_folder, regions_of_interest, cropped_images_folder)
-extracted_data = process_all_folders(cropped_images_folder)
-
-# Store extracted data in the database
-for page, fields in extracted_data.items():
-    print(f"Page: {page}")
-    store_results_in_db(fields, database_path)
-
-# Check contents of the database to verify insertion
-conn = sqlite3.connect(database_path)
-cursor = conn.cursor()
-cursor.execute("SELECT * FROM checks")
-rows = cursor.fetchall()
-for row in rows:
-    print(row)
-conn.close()
\ No newline at end of file
+if __name__ == "__main__":
+    # Define paths and parameters
+    pdf_file_path = r"Cheque.pdf"
+    extracted_images_folder = r"parsepdf"
+    resized_checks_folder = r"extracted_images"
+    cropped_images_folder = r"cropped_images"
+    database_path = r"checks.db"
+    fixed_width = 1000
+    fixed_height = 600
+    # Each worker holds its own copy of the model, so size this to the available RAM
+    ocr_workers = 2
+    regions_of_interest = {
+        'date': (754, 40, 970, 88),
+        'payee': (70, 120, 760, 175),
+        'name': (825, 440, 990, 475),
+        'amount_digits': (735, 225, 970, 290),
+        'account_number': (115, 300, 320, 335)
+    }
+
+    # Run the workflow
+    initialize_database(database_path)
+    parse_pdf(pdf_file_path, extracted_images_folder)
+    extract_checks(extracted_images_folder, resized_checks_folder, fixed_width, fixed_height)
+    extract_interest_regions(resized_checks_folder, regions_of_interest, cropped_images_folder)
+    with OCRWorkerPool(ocr_workers) as ocr_pool:
+        extracted_data = process_all_folders(cropped_images_folder, ocr_pool)
+
+    # Store extracted data in the database
+    for page, fields in extracted_data.items():
+        print(f"Page: {page}")
+        store_results_in_db(fields, database_path)
+
+    # Check contents of the database to verify insertion
+    conn = sqlite3.connect(database_path)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM checks")
+    rows = cursor.fetchall()
+    for row in rows:
+        print(row)
+    conn.close()
\ No newline at end of file
@@ -5,14 +5,9 @@ from tkinter import ttk
 import sqlite3
 from PIL import Image, ImageTk
 
-from transformers import TrOCRProcessor, VisionEncoderDecoderModel
-
 # Import your backend functions
 from backend import (
-    parse_pdf,
-    extract_checks,
-    extract_interest_regions,
-    process_all_folders,
+    process_pdf_streaming,
     initialize_database,
     store_results_in_db,
     search_checks,
@@ -36,10 +31,9 @@ class CheckProcessorApp:
         self.root = root
         self.root.title("Bank Check Processor")
         self.database_path = "checks.db"
-        self.extracted_images_folder = "extracted_images"
-        self.resized_checks_folder = "resized_images"
-        self.cropped_images_folder = "cropped_images"
         self.csv_file_path = "checks_export.csv"
+        # Set to a folder path to keep the intermediate page, check and crop images on disk
+        self.debug_dir = None
 
         self.create_widgets()
         initialize_database(self.database_path)
@@ -99,10 +93,7 @@ class CheckProcessorApp:
             messagebox.showerror("Error", "PDF file not found!")
             return
         
-        parse_pdf(pdf_file_path, self.extracted_images_folder)
-        extract_checks(self.extracted_images_folder, self.resized_checks_folder, 1000, 600)
-        extract_interest_regions(self.resized_checks_folder, regions_of_interest, self.cropped_images_folder)
-        extracted_data = process_all_folders(self.cropped_images_folder)
+        extracted_data = process_pdf_streaming(pdf_file_path, regions_of_interest, 1000, 600, debug_dir=self.debug_dir)
         
         for page, fields in extracted_data.items():
             store_results_in_db(fields, self.database_path)
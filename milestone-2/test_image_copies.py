@@ -0,0 +1,96 @@
+## Copy counting for the in-memory check pipeline: run with `python -m pytest` from milestone-2/.
+
+import os
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import backend
+import ocr_cache
+from layouts import DEFAULT_FIELDS
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dataset')
+
+
+def load_checks(monkeypatch, image_mode):
+    monkeypatch.setattr(backend, 'IMAGE_MODE', image_mode)
+    image_names = sorted(image_file for image_file in os.listdir(DATASET_DIR) if image_file.endswith('.jpeg'))
+    check_images = [backend.normalise_check(backend.read_check_image(os.path.join(DATASET_DIR, image_file), 1000, 600),
+                                            1000, 600) for image_file in image_names]
+    return image_names, check_images
+
+
+def peak_allocation(function, *args):
+    """Returns (result, peak bytes allocated while function runs); numpy buffers are traced too."""
+    tracemalloc.start()
+    try:
+        result = function(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('image_mode', ['GRAY', 'BGR'])
+def test_crops_reach_the_model_without_copies(monkeypatch, tmp_path, image_mode):
+    image_names, check_images = load_checks(monkeypatch, image_mode)
+    monkeypatch.setattr(backend, 'OCR_CACHE_PATH', str(tmp_path / 'ocr_cache.db'))
+    monkeypatch.setattr(backend, '_ocr_cache', {})
+
+    def from_a_check(crop):
+        return any(np.shares_memory(crop, check_image) for check_image in check_images)
+
+    blank_inputs, cache_inputs, boundary_inputs, boundary_outputs, model_inputs = [], [], [], [], []
+    peaks = {'blank_field_mask': [], 'crop_cache_key': []}
+
+    real_blank_field_mask = backend.blank_field_mask
+    def blank_field_mask(crops, *args, **kwargs):
+        blank_inputs.extend(crops)
+        blank, peak = peak_allocation(lambda: real_blank_field_mask(crops, *args, **kwargs))
+        peaks['blank_field_mask'].append((peak, max(crop.nbytes for crop in crops)))
+        return blank
+
+    real_crop_cache_key = ocr_cache.crop_cache_key
+    def crop_cache_key(crop, config):
+        cache_inputs.append(crop)
+        key, peak = peak_allocation(real_crop_cache_key, crop, config)
+        peaks['crop_cache_key'].append((peak, crop.nbytes))
+        return key
+
+    real_to_model_image = backend.to_model_image
+    def to_model_image(crop):
+        boundary_inputs.append(crop)
+        boundary_outputs.append(real_to_model_image(crop))
+        return boundary_outputs[-1]
+
+    def extract_text_batch(images, *args, **kwargs):
+        model_inputs.extend(images)
+        return ['1'] * len(images)
+
+    monkeypatch.setattr(backend, 'blank_field_mask', blank_field_mask)
+    monkeypatch.setattr(ocr_cache, 'crop_cache_key', crop_cache_key)
+    monkeypatch.setattr(backend, 'to_model_image', to_model_image)
+    monkeypatch.setattr(backend, 'extract_text_batch', extract_text_batch)
+
+    backend.ocr_check_batch(image_names, check_images, DEFAULT_FIELDS)
+    backend.ocr_result_cache().close()
+
+    # Up to the model boundary every crop is a view of its normalised check
+    assert blank_inputs and cache_inputs and boundary_inputs
+    assert all(from_a_check(crop) for crop in blank_inputs + cache_inputs + boundary_inputs)
+    # The boundary converts each OCRed crop exactly once, and that conversion is what the model gets
+    assert len(boundary_inputs) == len(model_inputs) == len(cache_inputs)
+    assert all(model_image is output for model_image, output in zip(model_inputs, boundary_outputs))
+    assert all(not from_a_check(output) and output.ndim == 3 for output in boundary_outputs)
+    # Hashing a crop never copies it out; the blank check holds at most one crop's working
+    # buffers (ink mask and component labels), never the stacked or float batch
+    assert all(peak < nbytes // 2 for peak, nbytes in peaks['crop_cache_key'])
+    assert all(peak < 8 * nbytes for peak, nbytes in peaks['blank_field_mask'])
+
+
+def test_pipeline_images_are_single_channel_uint8(monkeypatch):
+    image_names, check_images = load_checks(monkeypatch, 'GRAY')
+    assert all(check_image.dtype == np.uint8 and check_image.ndim == 2 for check_image in check_images)
+    for crops in backend.crop_field_batch(check_images, DEFAULT_FIELDS).values():
+        assert all(crop.base is not None and np.shares_memory(crop, check_image)
+                   for crop, check_image in zip(crops, check_images))
@@ -0,0 +1,52 @@
+## Lazy page-by-page image iterator for very large PDFs: peak memory stays flat however many pages the document has.
+
+from typing import Iterator, Optional, Tuple
+
+import cv2
+import fitz  # PyMuPDF
+import numpy as np
+
+from image_cache import XrefImageCache
+
+
+def iter_pdf_images(pdf_path, first_page: int = 1, last_page: Optional[int] = None,
+                    image_cache: Optional[XrefImageCache] = None,
+                    flags: int = cv2.IMREAD_COLOR) -> Iterator[Tuple[int, np.ndarray, dict]]:
+    """
+    Yields (page_no, image_array, metadata) for every image on pages first_page..last_page (1-based, inclusive).
+
+    Only one page is loaded at a time and MuPDF's object store is emptied after each page, so
+    the only thing that grows is the image cache, which is size-bounded. Images that several
+    pages reference come out of the cache and share one array, so treat the arrays as
+    read-only. `metadata` holds the xref, the image index on the page, the native extension,
+    the stored size and the raw encoded bytes.
+    """
+    if image_cache is None:
+        image_cache = XrefImageCache(max_bytes=64 * 1024 * 1024)
+
+    with fitz.open(pdf_path) as pdf_doc:
+        last_page = pdf_doc.page_count if last_page is None else min(last_page, pdf_doc.page_count)
+        for page_index in range(first_page - 1, last_page):
+            page = pdf_doc.load_page(page_index)
+            image_list = page.get_images(full=True)
+            del page
+
+            for image_index, image_info in enumerate(image_list, start=1):
+                xref = image_info[0]
+                base_image, image = image_cache.get(pdf_doc, xref, decode=True, flags=flags)
+                if image is None:
+                    print(f"Failed to decode image {image_index} on page {page_index + 1}")
+                    continue
+                metadata = {
+                    "xref": xref,
+                    "image_index": image_index,
+                    "ext": base_image["ext"],
+                    "width": base_image["width"],
+                    "height": base_image["height"],
+                    "image": base_image["image"],
+                }
+                yield page_index + 1, image, metadata
+
+            # Drop the pages, fonts and images MuPDF cached while reading this page
+            fitz.TOOLS.store_shrink(100)
+
@@ -2,9 +2,9 @@
 
 
 import os
+import cv2
 import fitz  # PyMuPDF
-from PIL import Image
-import io
+from image_cache import XrefImageCache, format_cache_report
 
 def parse_pdf(file_path):
     """
@@ -22,45 +22,50 @@ def parse_pdf(file_path):
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    output_text = ""
+    image_cache = XrefImageCache()
+    saved_images = {}  # xref -> file it was saved to
 
-    # Open the PDF file
-    pdf_document = fitz.open(file_path)
-    page_count = pdf_document.page_count
-    output_text += f"Total pages: {page_count}\n"
-
-    # Loop through each page in the PDF
-    for page_num in range(page_count):
-        page = pdf_document.load_page(page_num)
-        output_text += f"\nProcessing page: {page_num + 1}\n"
-
-        # Extract text from the page
-        text = page.get_text()
-        output_text += "Text found on page:\n"
-        output_text += text + "\n"
-
-        # Extract images from the page
-        image_list = page.get_images(full=True)
-        output_text += f"Found {len(image_list)} images on page\n"
-
-        # Loop through each image in the page
-        for img_index, img in enumerate(image_list, start=1):
-            xref = img[0]
-            base_image = pdf_document.extract_image(xref)
-            image_bytes = base_image["image"]
-
-            # Convert to PIL Image and save
-            image = Image.open(io.BytesIO(image_bytes))
-            image_filename = os.path.join(output_dir, f"page_{page_num + 1}_image_{img_index}.png")
-            image.save(image_filename)
-            output_text += f"Saved image: {image_filename}\n"
-
-    pdf_document.close()
-
-    # Save the extracted text to a file
+    # Write the report page by page instead of building it in memory
     output_text_filename = os.path.join(output_dir, "basic-pdf-parsing-output.txt")
-    with open(output_text_filename, "w") as output_file:
-        output_file.write(output_text)
+    with fitz.open(file_path) as pdf_document, open(output_text_filename, "w") as output_file:
+        page_count = pdf_document.page_count
+        output_file.write(f"Total pages: {page_count}\n")
+
+        # Loop through each page in the PDF
+        for page_num in range(page_count):
+            page = pdf_document.load_page(page_num)
+            output_file.write(f"\nProcessing page: {page_num + 1}\n")
+
+            # Extract text from the page
+            text = page.get_text()
+            output_file.write("Text found on page:\n")
+            output_file.write(text + "\n")
+
+            # Extract images from the page
+            image_list = page.get_images(full=True)
+            output_file.write(f"Found {len(image_list)} images on page\n")
+
+            # Loop through each image in the page
+            for img_index, img in enumerate(image_list, start=1):
+                xref = img[0]
+                # Images reused across pages (logos, backgrounds) are decoded and saved only once
+                if xref in saved_images:
+                    output_file.write(f"Image {img_index} already saved as: {saved_images[xref]}\n")
+                    continue
+                image = image_cache.decode_image(pdf_document, xref)
+                if image is None:
+                    output_file.write(f"Failed to decode image {img_index}\n")
+                    continue
+                image_filename = os.path.join(output_dir, f"page_{page_num + 1}_image_{img_index}.png")
+                cv2.imwrite(image_filename, image)
+                saved_images[xref] = image_filename
+                output_file.write(f"Saved image: {image_filename}\n")
+
+            # Release the page and whatever MuPDF cached for it before moving on
+            del page
+            fitz.TOOLS.store_shrink(100)
+
+        output_file.write("\n" + format_cache_report(image_cache.stats()) + "\n")
 
 # Path to the PDF file
 file_path = 'Python.pdf'
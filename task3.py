@@ -4,64 +4,187 @@ import fitz  # PyMuPDF
 from pathlib import Path
 import cv2
 import numpy as np
+from multiprocessing import Pool, cpu_count
+from PIL import Image
+from image_cache import XrefImageCache, format_cache_report, reduced_decode_flag
 
+# Check regions are detected on images about this wide, so the scans are decoded at reduced scale
+DETECT_WIDTH = 800
 
-def extract_pdf_images(pdf_filepath: Path, output_folder: Path):
-    output_folder.mkdir(parents=True, exist_ok=True)
 
-    with fitz.open(pdf_filepath) as pdf_doc:
-        for page_num, page in enumerate(pdf_doc, start=1):
-            image_data_list = page.get_images(full=True)
-            print(f"Page {page_num} has {len(image_data_list)} images.")
+def save_page_images(pdf_doc, page, page_num: int, output_folder: Path, image_cache: XrefImageCache,
+                     save_overlays: bool = False):
+    image_data_list = page.get_images(full=True)
+    print(f"Page {page_num} has {len(image_data_list)} images.")
 
-            for image_index, image_info in enumerate(image_data_list, start=1):
-                xref = image_info[0]
-                base_image = pdf_doc.extract_image(xref)
-                image_bytes = base_image["image"]
-                image_extension = base_image["ext"]
+    saved_paths = []
+    for image_index, image_info in enumerate(image_data_list, start=1):
+        xref, image_width = image_info[0], image_info[2]
+        # Detection only needs geometry: decode a reduced grayscale copy, never the full colour scan
+        flags, scale = reduced_decode_flag(image_width, DETECT_WIDTH)
+        base_image, image = image_cache.get(pdf_doc, xref, decode=True, flags=flags)
+        image_bytes = base_image["image"]
+        image_extension = base_image["ext"]
 
-                image_filename = f"page_{page_num}_img{image_index}.{image_extension}"
-                output_image_path = output_folder / image_filename
+        image_filename = f"page_{page_num}_img{image_index}.{image_extension}"
+        output_image_path = output_folder / image_filename
 
-                with open(output_image_path, "wb") as image_file:
-                    image_file.write(image_bytes)
+        with open(output_image_path, "wb") as image_file:
+            image_file.write(image_bytes)
 
-                print(f"Saved image: {output_image_path}")
+        print(f"Saved image: {output_image_path}")
+        saved_paths.append(output_image_path)
 
-                # Process the saved image to identify check regions
-                identify_check_regions(output_image_path)
+        # Identify check regions on the already-decoded image instead of reading the file back
+        identify_check_regions(output_image_path, image, save_overlays, scale)
 
+    return saved_paths
 
-def identify_check_regions(image_path: Path):
-    # Load the image
-    image = cv2.imread(str(image_path))
-    if image is None:
-        print(f"Failed to load image: {image_path}")
-        return
 
-    # Convert the image to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def split_page_ranges(page_count: int, workers: int):
+    # A few contiguous shards per worker so one slow range does not hold up the pool
+    shard_size = max(1, -(-page_count // (workers * 4)))
+    return [(start, min(start + shard_size, page_count))
+            for start in range(0, page_count, shard_size)]
 
-    # Apply Gaussian blur to the image
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
 
-    # Use Canny edge detection
-    edged = cv2.Canny(blurred, 50, 150)
+_worker_image_cache = None
+
 
-    # Find contours in the edged image
-    contours, _ = cv2.findContours(
-        edged.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+def _init_extract_worker():
+    # One cache per worker process, shared by all the page ranges that worker handles
+    global _worker_image_cache
+    _worker_image_cache = XrefImageCache()
 
-    check_regions = []
 
+def _extract_page_range(args):
+    # Pool worker: every process opens its own fitz handle
+    pdf_filepath, output_folder, start, end, save_overlays = args
+    stats_before = _worker_image_cache.stats()
+    saved_paths = []
+    with fitz.open(pdf_filepath) as pdf_doc:
+        for page_index in range(start, end):
+            saved_paths.extend(save_page_images(
+                pdf_doc, pdf_doc[page_index], page_index + 1, output_folder, _worker_image_cache,
+                save_overlays))
+    # Return only this range's share of the worker's counters, so the shards can be summed
+    stats_delta = {key: value - stats_before[key] for key, value in _worker_image_cache.stats().items()}
+    return saved_paths, stats_delta
+
+
+def extract_pdf_images(pdf_filepath: Path, output_folder: Path, workers: int = 1,
+                       save_overlays: bool = False, first_page: int = 1, last_page: int = None):
+    # Pages first_page..last_page are extracted (1-based, inclusive; None means the last page)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    with fitz.open(pdf_filepath) as pdf_doc:
+        page_count = pdf_doc.page_count
+    start = first_page - 1
+    end = page_count if last_page is None else min(last_page, page_count)
+
+    if workers > 1:
+        jobs = [(pdf_filepath, output_folder, start + shard_start, start + shard_end, save_overlays)
+                for shard_start, shard_end in split_page_ranges(max(0, end - start), workers)]
+        with Pool(workers, initializer=_init_extract_worker) as pool:
+            # pool.map keeps the shards, and so the saved paths, in page order
+            results = pool.map(_extract_page_range, jobs)
+        # An image shared across workers is extracted once per worker
+        stats = {}
+        for _, shard_stats in results:
+            for key, value in shard_stats.items():
+                stats[key] = stats.get(key, 0) + value
+        print(format_cache_report(stats))
+        return [path for shard_paths, _ in results for path in shard_paths]
+
+    saved_paths = []
+    image_cache = XrefImageCache()
+    with fitz.open(pdf_filepath) as pdf_doc:
+        for page_index in range(start, end):
+            saved_paths.extend(save_page_images(pdf_doc, pdf_doc[page_index], page_index + 1, output_folder,
+                                                image_cache, save_overlays))
+    print(format_cache_report(image_cache.stats()))
+    return saved_paths
+
+
+def merge_overlapping_boxes(boxes, overlap: float = 0.5):
+    """Repeatedly merges (x, y, w, h) boxes whose intersection covers `overlap` of the smaller box."""
+    boxes = list(boxes)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                ax, ay, aw, ah = boxes[i]
+                bx, by, bw, bh = boxes[j]
+                inter_w = min(ax + aw, bx + bw) - max(ax, bx)
+                inter_h = min(ay + ah, by + bh) - max(ay, by)
+                if inter_w <= 0 or inter_h <= 0:
+                    continue
+                if inter_w * inter_h >= overlap * min(aw * ah, bw * bh):
+                    x, y = min(ax, bx), min(ay, by)
+                    boxes[i] = (x, y, max(ax + aw, bx + bw) - x, max(ay + ah, by + bh) - y)
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return boxes
+
+
+def detect_check_regions(image: np.ndarray, detect_width: int = 800,
+                         min_aspect: float = 1.8, max_aspect: float = 2.8,
+                         min_area_ratio: float = 0.04):
+    """
+    Finds cheque-shaped regions in a BGR or grayscale image and returns full-resolution (x, y, w, h) boxes.
+
+    Edges and contours are computed on a copy downscaled to `detect_width` pixels wide, and the
+    boxes are scaled back up. A box is kept when its width/height ratio is in the cheque range
+    [min_aspect, max_aspect] and it covers at least `min_area_ratio` of the image; overlapping
+    boxes are merged, so a scan with several cheques on one sheet gives one box per cheque.
+    An image that is itself a single cropped cheque gives one box covering it.
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    scale = min(1.0, detect_width / width)
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1.0 else gray
+
+    blurred = cv2.GaussianBlur(small, (5, 5), 0)
+    edged = cv2.Canny(blurred, 50, 150)
+    # Close small gaps in the cheque borders so each cheque gives one outer contour
+    edged = cv2.dilate(edged, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    min_area = min_area_ratio * small.shape[0] * small.shape[1]
+    boxes = []
     for contour in contours:
-        # Get the bounding box for each contour
         x, y, w, h = cv2.boundingRect(contour)
+        if w * h >= min_area and min_aspect <= w / h <= max_aspect:
+            boxes.append((x, y, w, h))
+    boxes = merge_overlapping_boxes(boxes)
+
+    if not boxes and min_aspect <= width / height <= max_aspect:
+        return [(0, 0, width, height)]
+
+    return [(int(x / scale), int(y / scale), min(width, round(w / scale)), min(height, round(h / scale)))
+            for x, y, w, h in sorted(boxes, key=lambda box: (box[1], box[0]))]
+
+
+def identify_check_regions(image_path: Path, image: np.ndarray = None, save_overlay: bool = False,
+                           scale: int = 1):
+    # Use the in-memory image when the caller already has it (decoded at 1/scale), otherwise load
+    # a reduced grayscale copy; the returned boxes are always in full-resolution pixels
+    if image is None:
+        try:
+            with Image.open(image_path) as header:
+                flags, scale = reduced_decode_flag(header.width, DETECT_WIDTH)
+        except OSError:
+            flags, scale = cv2.IMREAD_GRAYSCALE, 1
+        image = cv2.imread(str(image_path), flags)
+    if image is None:
+        print(f"Failed to load image: {image_path}")
+        return []
 
-        # Check if the contour is likely a check region based on some criteria
-        if w > 100 and h > 50:  # Example criteria: width > 100 pixels and height > 50 pixels
-            check_regions.append((x, y, w, h))
-            cv2.rectangle(image, (x, y), (x + w, y + h), (0, 255, 0), 2)
+    check_regions = [(x * scale, y * scale, w * scale, h * scale)
+                     for x, y, w, h in detect_check_regions(image, DETECT_WIDTH)]
 
     if check_regions:
         print(
@@ -69,14 +192,20 @@ def identify_check_regions(image_path: Path):
     else:
         print(f"No check regions identified in {image_path}")
 
-    # Save the processed image with detected regions
-    processed_image_path = image_path.stem + "_processed" + image_path.suffix
-    cv2.imwrite(str(image_path.parent / processed_image_path), image)
-    print(
-        f"Processed image saved as: {image_path.parent / processed_image_path}")
+    # Only draw and save the overlay when asked for it
+    if save_overlay:
+        overlay = cv2.imread(str(image_path))
+        for x, y, w, h in check_regions:
+            cv2.rectangle(overlay, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        processed_image_path = image_path.stem + "_processed" + image_path.suffix
+        cv2.imwrite(str(image_path.parent / processed_image_path), overlay)
+        print(
+            f"Processed image saved as: {image_path.parent / processed_image_path}")
+
+    return check_regions
 
 
 if __name__ == "__main__":
     pdf_path = Path("cheque.pdf")
     output_folder = Path("task3-output")
-    extract_pdf_images(pdf_path, output_folder)
\ No newline at end of file
+    extract_pdf_images(pdf_path, output_folder, workers=cpu_count(), save_overlays=True)
\ No newline at end of file
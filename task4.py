@@ -1,48 +1,47 @@
 ## This task is about the Check Image Extraction: Implement the module to extract and save individual check images using OpenCV.
 
-import fitz
 import os
 import cv2
-import numpy as np
+from image_cache import XrefImageCache, format_cache_report
+from pdf_images import iter_pdf_images
 
-def extract_images_from_pdf(pdf_path, output_folder):
+def extract_images_from_pdf(pdf_path, output_folder, first_page=1, last_page=None):
     """
     Extracts images from a PDF and saves them to the specified output folder using OpenCV.
     
     Args:
         pdf_path (str): The path to the PDF file.
         output_folder (str): The folder where the extracted images will be saved.
+        first_page (int): The first page to extract from (1-based).
+        last_page (int): The last page to extract from, inclusive; None means the last page of the PDF.
     """
     # Create the output folder if it doesn't exist
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    document = fitz.open(pdf_path)
+    image_cache = XrefImageCache()
     
+    # Pages are loaded and decoded one at a time, so memory stays flat on very large PDFs
     image_counter = 1
-    for page_number in range(len(document)):
-        page = document.load_page(page_number)
-        image_list = page.get_images(full=True)
+    page_numbers = set()
+    saved_images = {}  # xref -> file it was saved to
+    for page_number, image_cv, metadata in iter_pdf_images(pdf_path, first_page, last_page, image_cache):
+        page_numbers.add(page_number)
+        # An image referenced from several pages is saved once, not re-encoded for every reference
+        if metadata["xref"] in saved_images:
+            print(f"Image {metadata['image_index']} on page {page_number} already saved as {saved_images[metadata['xref']]}")
+            continue
+
+        # Define the output image path
+        image_filename = os.path.join(output_folder, f'cheque_{image_counter}.{metadata["ext"]}')
         
-        for image_index, img in enumerate(image_list):
-            xref = img[0]
-            base_image = document.extract_image(xref)
-            image_bytes = base_image["image"]
-            image_ext = base_image["ext"]
-            
-            # Convert image bytes to a numpy array
-            image_np = np.frombuffer(image_bytes, np.uint8)
-            # Decode the numpy array to an image
-            image_cv = cv2.imdecode(image_np, cv2.IMREAD_COLOR)
-            
-            # Define the output image path
-            image_filename = os.path.join(output_folder, f'cheque_{image_counter}.{image_ext}')
-            
-            # Save the image using OpenCV
-            cv2.imwrite(image_filename, image_cv)
-            image_counter += 1
+        # Save the image using OpenCV
+        cv2.imwrite(image_filename, image_cv)
+        saved_images[metadata["xref"]] = image_filename
+        image_counter += 1
     
-    print(f"Extracted images from {len(document)} pages in {pdf_path}")
+    print(f"Extracted {image_counter - 1} images from {len(page_numbers)} pages in {pdf_path}")
+    print(format_cache_report(image_cache.stats()))
 
 if __name__ == "__main__":
     pdf_path = 'cheque.pdf'
@@ -0,0 +1,151 @@
+## In-process Tesseract OCR: one persistent API handle per worker thread instead of one tesseract.exe per image.
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:  # Fall back to the CLI wrapper, which spawns tesseract for every image
+    tesserocr = None
+
+# Only used by the pytesseract fallback. This is the path for tesseract executable file. You need to change this path according to your tesseract installation
+TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tiff', '.bmp', '.gif')
+
+
+class TesseractEngine:
+    """
+    Tesseract OCR engine that loads the language data once per thread and reuses it for every image.
+
+    Each thread that calls `image_to_string` gets its own `tesserocr.PyTessBaseAPI`, created on
+    first use and kept until `close`, so the engine can be shared by a thread pool. Images go to
+    Tesseract straight from memory: PIL images as they are, numpy arrays (grayscale or RGB) as
+    raw pixel buffers. Without tesserocr installed the engine falls back to pytesseract.
+    """
+
+    def __init__(self, lang: str = 'eng', psm: Optional[int] = None, tessdata_path: Optional[str] = None):
+        self.lang = lang
+        self.psm = psm
+        self.tessdata_path = tessdata_path or os.environ.get('TESSDATA_PREFIX')
+        self._local = threading.local()
+        self._apis = []
+        self._apis_lock = threading.Lock()
+        if tesserocr is None:
+            import pytesseract
+            pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+            print("tesserocr is not installed, falling back to pytesseract (one tesseract process per image)")
+
+    def _api(self):
+        api = getattr(self._local, 'api', None)
+        if api is None:
+            if self.tessdata_path:
+                api = tesserocr.PyTessBaseAPI(path=self.tessdata_path, lang=self.lang)
+            else:
+                api = tesserocr.PyTessBaseAPI(lang=self.lang)
+            if self.psm is not None:
+                api.SetPageSegMode(self.psm)
+            self._local.api = api
+            with self._apis_lock:
+                self._apis.append(api)
+        return api
+
+    def _set_image(self, image):
+        api = self._api()
+        if isinstance(image, np.ndarray):
+            image = np.ascontiguousarray(image)
+            height, width = image.shape[:2]
+            bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+            api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, image.strides[0])
+        else:
+            api.SetImage(image)
+        return api
+
+    def _pytesseract_config(self):
+        return f'--psm {self.psm}' if self.psm is not None else ''
+
+    def image_to_string(self, image) -> str:
+        """OCRs a PIL image or a grayscale/RGB uint8 numpy array and returns its text."""
+        if tesserocr is None:
+            import pytesseract
+            return pytesseract.image_to_string(image, lang=self.lang, config=self._pytesseract_config())
+        return self._set_image(image).GetUTF8Text()
+
+    def image_to_text_and_confidence(self, image) -> Tuple[str, float]:
+        """Like `image_to_string`, but also returns Tesseract's mean word confidence (0-100, 0 if nothing was read)."""
+        if tesserocr is None:
+            import pytesseract
+            data = pytesseract.image_to_data(image, lang=self.lang, config=self._pytesseract_config(),
+                                             output_type=pytesseract.Output.DICT)
+            words = [(word, float(conf)) for word, conf in zip(data['text'], data['conf'])
+                     if word.strip() and float(conf) >= 0]
+            text = ' '.join(word for word, _ in words)
+            return text, sum(conf for _, conf in words) / len(words) if words else 0.0
+        api = self._set_image(image)
+        text = api.GetUTF8Text()
+        return text, float(api.MeanTextConf()) if text.strip() else 0.0
+
+    def close(self):
+        """Releases every API handle the engine created."""
+        with self._apis_lock:
+            for api in self._apis:
+                api.End()
+            self._apis = []
+        self._local = threading.local()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def list_images(input_dir: str):
+    return [image_name for image_name in sorted(os.listdir(input_dir))
+            if image_name.lower().endswith(IMAGE_EXTENSIONS)]
+
+
+def _ocr_file(engine: TesseractEngine, image_path: str) -> str:
+    with Image.open(image_path) as image:
+        return engine.image_to_string(image)
+
+
+# Process pools get one engine per worker process, created by the pool initializer
+_worker_engine = None
+
+
+def _init_worker_engine(lang, psm, tessdata_path):
+    global _worker_engine
+    _worker_engine = TesseractEngine(lang, psm, tessdata_path)
+
+
+def _ocr_file_in_worker(image_path: str) -> str:
+    return _ocr_file(_worker_engine, image_path)
+
+
+def ocr_directory(input_dir: str, workers: Optional[int] = None, use_processes: bool = False,
+                  lang: str = 'eng', psm: Optional[int] = None,
+                  tessdata_path: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """
+    OCRs every image in input_dir in parallel and yields (image_name, text) in file-name order.
+
+    By default the images are spread over a thread pool sharing one engine (tesserocr releases
+    the GIL while recognising); with use_processes=True a process pool is used instead, each
+    worker holding its own engine. `workers` defaults to the number of CPUs.
+    """
+    image_names = list_images(input_dir)
+    image_paths = [os.path.join(input_dir, image_name) for image_name in image_names]
+    workers = workers or os.cpu_count() or 1
+
+    if use_processes:
+        with ProcessPoolExecutor(workers, initializer=_init_worker_engine,
+                                 initargs=(lang, psm, tessdata_path)) as pool:
+            yield from zip(image_names, pool.map(_ocr_file_in_worker, image_paths))
+    else:
+        with TesseractEngine(lang, psm, tessdata_path) as engine, ThreadPoolExecutor(workers) as pool:
+            yield from zip(image_names, pool.map(lambda image_path: _ocr_file(engine, image_path), image_paths))